@@ -1,12 +1,22 @@
 import asyncio
+import bisect
+import itertools
+import json
+import math
 import logging
 import os
 import random
 import re
+import shutil
+import sqlite3
 import string
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from collections import OrderedDict, deque
 from flask import Flask
-from pyrogram import Client, filters
-from pyrogram.types import Message
+from pyrogram import Client, enums, filters, raw, types, utils
+from pyrogram.types import Message, InputMediaPhoto, InputMediaVideo, InputMediaAudio, InputMediaDocument
 from pyrogram.errors import FloodWait
 
 # Create Flask app for port binding
@@ -27,16 +37,933 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Telegram returns at most 200 messages per get_messages call
+FETCH_BATCH_SIZE = 200
+# ...and forwards at most 100 messages per ForwardMessages call
+FORWARD_BATCH_SIZE = 100
+# Upload part size for SaveBigFilePart (every part but the last must be exactly this size)
+UPLOAD_PART_SIZE = 512 * 1024
+# Telegram only accepts SaveBigFilePart uploads for files above 10 MiB
+BIG_FILE_MIN_SIZE = 10 * 1024 * 1024
+# Chats listed per /chats page
+CHATS_PAGE_SIZE = 10
+# History/replies pages hold at most 100 messages
+HISTORY_PAGE_SIZE = 100
+# Message IDs are 32-bit - "all" in a link is clipped to the chat's newest message
+MAX_MESSAGE_ID = 2 ** 31 - 1
+# /tgprobackup type= values (named like MessageMediaType) and the server-side search filter for each
+SEARCH_FILTERS = {
+    'photo': raw.types.InputMessagesFilterPhotos,
+    'video': raw.types.InputMessagesFilterVideo,
+    'document': raw.types.InputMessagesFilterDocument,
+    'audio': raw.types.InputMessagesFilterMusic,
+    'voice': raw.types.InputMessagesFilterVoice,
+    'animation': raw.types.InputMessagesFilterGif,
+    'video_note': raw.types.InputMessagesFilterRoundVideo,
+}
+# min_size= suffixes
+SIZE_UNITS = {'': 1, 'b': 1, 'k': 1024, 'kb': 1024, 'm': 1024 ** 2, 'mb': 1024 ** 2, 'g': 1024 ** 3, 'gb': 1024 ** 3}
+
+class TokenBucket:
+    """Token bucket - refills `rate` tokens per second up to `capacity`"""
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+        self.lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        """Hold every caller back for `seconds` (e.g. a FloodWait)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens=1):
+        """Take tokens, waiting only while the bucket is over budget"""
+        async with self.lock:
+            while True:
+                blocked = self.blocked_until - time.monotonic()
+                if blocked > 0:
+                    await asyncio.sleep(blocked)
+                    continue
+
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+class RateLimiter:
+    """
+    Shared limiter with one token bucket per Telegram method class (read, send, edit),
+    plus a paced bucket per (method class, peer) whose rate is learned by a PacingController
+    """
+    def __init__(self, rates, pacing):
+        # rates: {kind: (tokens_per_second, burst)}
+        self.buckets = {kind: TokenBucket(rate, burst) for kind, (rate, burst) in rates.items()}
+        self.ceilings = {kind: rate for kind, (rate, burst) in rates.items()}
+        self.bursts = {kind: burst for kind, (rate, burst) in rates.items()}
+        self.pacing = pacing
+        self.peer_buckets = {}
+
+    def peer_bucket(self, kind, peer):
+        key = PacingController.key(kind, peer)
+        bucket = self.peer_buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.pacing.rate(key, self.ceilings[kind]), self.bursts[kind])
+            self.peer_buckets[key] = bucket
+        return bucket
+
+    async def acquire(self, kind, peer=None):
+        await self.buckets[kind].acquire()
+        if peer is not None:
+            await self.peer_bucket(kind, peer).acquire()
+
+    def on_flood(self, kind, peer, seconds):
+        """FloodWait - hold the bucket for the wait time and cut its rate"""
+        bucket = self.peer_bucket(kind, peer) if peer is not None else self.buckets[kind]
+        bucket.pause(seconds)
+        if peer is not None:
+            bucket.rate = self.pacing.decrease(PacingController.key(kind, peer), self.ceilings[kind])
+
+    def on_success(self, kind, peer):
+        if peer is not None:
+            self.peer_bucket(kind, peer).rate = self.pacing.increase(PacingController.key(kind, peer), self.ceilings[kind])
+
+class PacingController:
+    """
+    AIMD pacing - every FloodWait halves the rate for that (method class, peer),
+    every success adds a small step back up to the configured ceiling.
+    Learned rates are saved to disk so a fresh deploy starts near the safe rate.
+    """
+    def __init__(self, path, increase=0.01, decrease=0.5, min_rate=0.01, save_interval=30):
+        self.path = path
+        self.increase_step = increase
+        self.decrease_factor = decrease
+        self.min_rate = min_rate
+        self.save_interval = save_interval
+        self.rates = {}
+        self.dirty = False
+        self.last_save = 0
+        self.load()
+
+    @staticmethod
+    def key(kind, peer):
+        return f"{kind}:{peer}"
+
+    def rate(self, key, ceiling):
+        return min(ceiling, self.rates.get(key, ceiling))
+
+    def decrease(self, key, ceiling):
+        rate = max(self.min_rate, self.rate(key, ceiling) * self.decrease_factor)
+        self.rates[key] = rate
+        logger.warning(f"🐢 Pacing {key} lowered to {rate:.3f}/s")
+        self.dirty = True
+        self.save(force=True)
+        return rate
+
+    def increase(self, key, ceiling):
+        if key not in self.rates:
+            return ceiling
+        rate = self.rates[key] + self.increase_step
+        if rate >= ceiling:
+            # Fully recovered - forget the learned limit
+            del self.rates[key]
+            rate = ceiling
+        else:
+            self.rates[key] = rate
+        self.dirty = True
+        self.save()
+        return rate
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                self.rates = {key: float(rate) for key, rate in json.load(f).items()}
+            logger.info(f"🐢 Loaded {len(self.rates)} learned pacing rates")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load pacing rates from {self.path}: {e}")
+
+    def save(self, force=False):
+        if not self.dirty or (not force and time.monotonic() - self.last_save < self.save_interval):
+            return
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.rates, f)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+            self.last_save = time.monotonic()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save pacing rates to {self.path}: {e}")
+
+class SpoolFullError(Exception):
+    """A download can never fit into the spool directory"""
+
+class SpoolManager:
+    """
+    Admission control for the downloads spool directory - a download only starts once its
+    file_size fits both the byte quota and the free disk space, and waits while earlier
+    files are still being uploaded. Waiting requests are admitted strictly in arrival order.
+    Each download gets its own sub-directory so concurrent downloads never collide, and
+    anything left over from a crash is cleared on startup.
+    """
+    def __init__(self, directory, quota_bytes=0, min_free_bytes=0, poll_interval=5):
+        self.directory = directory
+        self.quota_bytes = quota_bytes  # 0 = no quota, only free disk space counts
+        self.min_free_bytes = min_free_bytes
+        self.poll_interval = poll_interval
+        self.used_bytes = 0
+        self.files = {}  # path -> reserved bytes
+        self.waiting = deque()  # Tickets of waiting reserve() calls, oldest first
+        self.condition = asyncio.Condition()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def clear_orphans(self):
+        """Remove everything left behind by a process that died between download and cleanup"""
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+                removed += 1
+            except Exception as e:
+                logger.warning(f"⚠️ Could not remove orphaned spool entry {path}: {e}")
+        if removed:
+            logger.info(f"🧹 Cleared {removed} orphaned spool entries from {self.directory}")
+
+    def free_bytes(self):
+        return shutil.disk_usage(self.directory).free - self.min_free_bytes
+
+    def fits_quota(self, size):
+        return not self.quota_bytes or size <= self.quota_bytes
+
+    def fits_now(self, size):
+        within_quota = not self.quota_bytes or self.used_bytes + size <= self.quota_bytes
+        # Finished files already take up disk space, reservations still being downloaded don't yet
+        unwritten = self.used_bytes - sum(self.files.values())
+        return within_quota and size + unwritten <= self.free_bytes()
+
+    async def reserve(self, size, wait=True):
+        """
+        Reserve `size` bytes for a download. Waiting calls are admitted in arrival order, so
+        callers must reserve in pipeline order; the oldest one fails instead of waiting when
+        nothing pending could free enough space. With wait=False the bytes are taken right
+        away or not at all - for downloads made out of pipeline order
+        """
+        if not self.fits_quota(size):
+            raise SpoolFullError(f"{size} bytes exceeds spool quota of {self.quota_bytes} bytes")
+
+        async with self.condition:
+            if not wait:
+                if not self.fits_now(size):
+                    raise SpoolFullError(f"{size} bytes do not fit the spool right now ({self.used_bytes} bytes pending)")
+                self.used_bytes += size
+                return
+
+            ticket = object()
+            self.waiting.append(ticket)
+            try:
+                while True:
+                    if self.waiting[0] is ticket:
+                        if self.fits_now(size):
+                            self.used_bytes += size
+                            return
+                        if not self.used_bytes:
+                            # Nothing of ours is pending that could free up space
+                            raise SpoolFullError(f"{size} bytes needed, only {max(0, self.free_bytes())} bytes free on disk")
+                        logger.info(f"⏳ Spool full ({self.used_bytes} bytes pending), holding back a {size} byte download")
+                    try:
+                        await asyncio.wait_for(self.condition.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self.waiting.remove(ticket)
+                self.condition.notify_all()
+
+    async def release(self, size):
+        async with self.condition:
+            self.used_bytes = max(0, self.used_bytes - size)
+            self.condition.notify_all()
+
+    def path_for(self, message, filename):
+        """
+        A fresh sub-directory per download, so equal file names - or the same message
+        downloaded by two jobs at once - never overwrite or delete each other
+        """
+        directory = tempfile.mkdtemp(prefix=f"{message.chat.id}_{message.id}_", dir=self.directory)
+        return os.path.join(directory, filename)
+
+    def track(self, path, size):
+        self.files[path] = size
+
+    async def discard(self, path):
+        """Delete a downloaded file with its sub-directory and give its bytes back"""
+        try:
+            os.remove(path)
+        except Exception as cleanup_error:
+            logger.warning(f"⚠️ Could not delete file {path}: {cleanup_error}")
+        directory = os.path.dirname(path)
+        if os.path.abspath(directory) != os.path.abspath(self.directory):
+            shutil.rmtree(directory, ignore_errors=True)
+        await self.release(self.files.pop(path, 0))
+
+class JobStore:
+    """
+    SQLite store for backup jobs - the job spec, running counters and a per-message
+    status table, checkpointed after every message so a restart resumes where it stopped
+    """
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        with self.db:
+            self.db.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    user_chat_id INTEGER NOT NULL,
+                    chat_id INTEGER NOT NULL,
+                    chat_title TEXT,
+                    spec TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'running',
+                    last_message_id INTEGER NOT NULL DEFAULT 0,
+                    success INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    missing INTEGER NOT NULL DEFAULT 0,
+                    skipped INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS job_messages (
+                    job_id INTEGER NOT NULL,
+                    message_id INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    PRIMARY KEY (job_id, message_id)
+                );
+            """)
+
+    def create(self, user_id, user_chat_id, chat, spec):
+        now = time.time()
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO jobs (user_id, user_chat_id, chat_id, chat_title, spec, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (user_id, user_chat_id, chat['id'], chat['title'], json.dumps(spec), now, now)
+            )
+        return cursor.lastrowid
+
+    def get(self, job_id):
+        return self.db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def unfinished(self, user_id=None, statuses=('running',)):
+        query = f"SELECT * FROM jobs WHERE status IN ({','.join('?' * len(statuses))})"
+        params = list(statuses)
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        return self.db.execute(query + " ORDER BY id", params).fetchall()
+
+    def processed_ids(self, job_id):
+        """IDs a resume skips - failed messages are left out so they get another try"""
+        return {row[0] for row in self.db.execute("SELECT message_id FROM job_messages WHERE job_id = ? AND status != 'failed'", (job_id,))}
+
+    def missing_ids(self, job_id, limit=10):
+        return [row[0] for row in self.db.execute(
+            "SELECT message_id FROM job_messages WHERE job_id = ? AND status = 'missing' ORDER BY message_id LIMIT ?",
+            (job_id, limit)
+        )]
+
+    def checkpoint(self, job_id, results):
+        """Commit a batch of (message_id, status) results and bump the job counters in one transaction"""
+        counts = {'done': 0, 'failed': 0, 'missing': 0, 'skipped': 0, 'filtered': 0}
+        for _, status in results:
+            counts[status] += 1
+        with self.db:
+            # Retried messages that failed before no longer count as failed
+            placeholders = ', '.join('?' * len(results))
+            counts['failed'] -= self.db.execute(
+                f"SELECT COUNT(*) FROM job_messages WHERE job_id = ? AND status = 'failed' AND message_id IN ({placeholders})",
+                (job_id, *(message_id for message_id, _ in results))
+            ).fetchone()[0]
+            self.db.executemany(
+                "INSERT OR REPLACE INTO job_messages (job_id, message_id, status) VALUES (?, ?, ?)",
+                [(job_id, message_id, status) for message_id, status in results]
+            )
+            self.db.execute(
+                "UPDATE jobs SET success = success + ?, failed = failed + ?, missing = missing + ?, skipped = skipped + ?, "
+                "last_message_id = MAX(last_message_id, ?), updated_at = ? WHERE id = ?",
+                (counts['done'], counts['failed'], counts['missing'], counts['skipped'], max(m for m, _ in results), time.time(), job_id)
+            )
+
+    def count_status(self, job_id, status):
+        return self.db.execute("SELECT COUNT(*) FROM job_messages WHERE job_id = ? AND status = ?", (job_id, status)).fetchone()[0]
+
+    def set_status(self, job_id, status):
+        with self.db:
+            self.db.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?", (status, time.time(), job_id))
+
+class MediaIndex:
+    """
+    On-disk index of media already delivered, keyed on the source file_unique_id and the
+    destination chat - reposts and overlapping ranges are recognised before any download
+    """
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        with self.db:
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS media_index (
+                    file_unique_id TEXT NOT NULL,
+                    dest_chat_id INTEGER NOT NULL,
+                    dest_message_id INTEGER NOT NULL,
+                    file_id TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (file_unique_id, dest_chat_id)
+                )
+            """)
+
+    def lookup(self, file_unique_id, dest_chat_id):
+        return self.db.execute(
+            "SELECT * FROM media_index WHERE file_unique_id = ? AND dest_chat_id = ?",
+            (file_unique_id, dest_chat_id)
+        ).fetchone()
+
+    def record(self, file_unique_id, dest_chat_id, dest_message_id, file_id):
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO media_index (file_unique_id, dest_chat_id, dest_message_id, file_id, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (file_unique_id, dest_chat_id, dest_message_id, file_id, time.time())
+            )
+
+class FileIdCache:
+    """
+    Bounded LRU of source file_unique_id -> uploaded destination file_id, persisted in SQLite.
+    Once a file has been uploaded, every later send of the same media (to any chat) reuses it
+    """
+    def __init__(self, path, capacity=10000):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        with self.db:
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS file_id_cache (
+                    file_unique_id TEXT PRIMARY KEY,
+                    file_id TEXT NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+        rows = self.db.execute(
+            "SELECT file_unique_id, file_id FROM file_id_cache ORDER BY last_used DESC LIMIT ?",
+            (capacity,)
+        ).fetchall()
+        for file_unique_id, file_id in reversed(rows):
+            self.entries[file_unique_id] = file_id
+
+    def get(self, file_unique_id):
+        file_id = self.entries.get(file_unique_id)
+        if file_id is not None:
+            self.entries.move_to_end(file_unique_id)
+            with self.db:
+                self.db.execute("UPDATE file_id_cache SET last_used = ? WHERE file_unique_id = ?", (time.time(), file_unique_id))
+        return file_id
+
+    def put(self, file_unique_id, file_id):
+        self.entries[file_unique_id] = file_id
+        self.entries.move_to_end(file_unique_id)
+        evicted = []
+        while len(self.entries) > self.capacity:
+            evicted.append(self.entries.popitem(last=False)[0])
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO file_id_cache (file_unique_id, file_id, last_used) VALUES (?, ?, ?)",
+                (file_unique_id, file_id, time.time())
+            )
+            self.db.executemany("DELETE FROM file_id_cache WHERE file_unique_id = ?", [(key,) for key in evicted])
+
+    def discard(self, file_unique_id):
+        self.entries.pop(file_unique_id, None)
+        with self.db:
+            self.db.execute("DELETE FROM file_id_cache WHERE file_unique_id = ?", (file_unique_id,))
+
+class ChatCache:
+    """
+    Remembers how each link chat ID resolved - the ID format get_chat accepted, the title
+    and the type - for ttl seconds, persisted to JSON so a restart keeps it.
+    A cached chat is returned without any API call
+    """
+    def __init__(self, path, ttl=7 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self.entries = {}
+        self.load()
+
+    def get(self, link_chat_id):
+        entry = self.entries.get(str(link_chat_id))
+        if entry is None:
+            return None
+        if entry['expires'] < time.time():
+            self.invalidate(link_chat_id)
+            return None
+        return {'id': entry['id'], 'title': entry['title'], 'type': entry['type']}
+
+    def put(self, link_chat_id, chat_id_format, chat):
+        self.entries[str(link_chat_id)] = {
+            'format': str(chat_id_format),
+            'id': chat['id'],
+            'title': chat['title'],
+            'type': getattr(chat['type'], 'value', chat['type']),
+            'expires': time.time() + self.ttl,
+        }
+        self.save()
+
+    def invalidate(self, link_chat_id):
+        if self.entries.pop(str(link_chat_id), None) is not None:
+            self.save()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                now = time.time()
+                self.entries = {key: entry for key, entry in json.load(f).items() if entry['expires'] >= now}
+            logger.info(f"💾 Loaded {len(self.entries)} cached chat resolutions")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load chat cache from {self.path}: {e}")
+
+    def save(self):
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save chat cache to {self.path}: {e}")
+
+class DialogIndex:
+    """
+    In-memory index of the groups/channels the account is in - by ID, by username and by
+    title prefix. Built from one get_dialogs() walk, kept fresh from incoming updates and
+    snapshotted to JSON so a restart can answer lookups before the next walk finishes.
+    """
+    CHAT_TYPES = (enums.ChatType.GROUP, enums.ChatType.SUPERGROUP, enums.ChatType.CHANNEL)
+
+    def __init__(self, path, save_interval=60):
+        self.path = path
+        self.save_interval = save_interval
+        self.chats = {}
+        self.usernames = {}
+        self.titles = []
+        self.titles_stale = False
+        self.dirty = False
+        self.last_save = 0
+        self.load()
+
+    @staticmethod
+    def entry(chat, last_activity=0):
+        return {
+            'id': chat.id,
+            'title': chat.title,
+            'type': chat.type.value,
+            'username': getattr(chat, 'username', None),
+            'last_activity': last_activity,
+        }
+
+    def rebuild(self, entries):
+        self.chats = {entry['id']: entry for entry in entries}
+        self.usernames = {entry['username'].lower(): entry['id'] for entry in entries if entry.get('username')}
+        self.titles_stale = True
+        self.dirty = True
+
+    def update(self, chat, last_activity=None):
+        """Add or refresh a chat seen in an update; returns False for chats that are not groups/channels"""
+        if chat is None or chat.type not in self.CHAT_TYPES:
+            return False
+        known = self.chats.get(chat.id)
+        entry = self.entry(chat, last_activity or (known['last_activity'] if known else 0))
+        if known and known['username'] and known['username'] != entry['username']:
+            self.usernames.pop(known['username'].lower(), None)
+        if entry['username']:
+            self.usernames[entry['username'].lower()] = chat.id
+        if not known or known['title'] != entry['title']:
+            self.titles_stale = True
+        self.chats[chat.id] = entry
+        self.dirty = True
+        self.save()
+        return True
+
+    def remove(self, chat_id):
+        entry = self.chats.pop(chat_id, None)
+        if entry:
+            if entry['username']:
+                self.usernames.pop(entry['username'].lower(), None)
+            self.titles_stale = True
+            self.dirty = True
+            self.save(force=True)
+
+    def get(self, chat_id):
+        return self.chats.get(chat_id)
+
+    def all(self):
+        """Every indexed chat, most recently active first"""
+        return sorted(self.chats.values(), key=lambda entry: entry['last_activity'], reverse=True)
+
+    def search(self, query):
+        """Look a chat up by ID, @username or title prefix"""
+        query = query.strip()
+        try:
+            chat = self.chats.get(int(query))
+            return [chat] if chat else []
+        except ValueError:
+            pass
+
+        chat_id = self.usernames.get(query.lstrip('@').lower())
+        if chat_id is not None:
+            return [self.chats[chat_id]]
+
+        if self.titles_stale:
+            self.titles = sorted((entry['title'] or '').lower() + '\0' + str(entry['id']) for entry in self.chats.values())
+            self.titles_stale = False
+        prefix = query.lower()
+        matches = []
+        for key in self.titles[bisect.bisect_left(self.titles, prefix):]:
+            if not key.startswith(prefix):
+                break
+            matches.append(self.chats[int(key.rsplit('\0', 1)[1])])
+        return sorted(matches, key=lambda entry: entry['last_activity'], reverse=True)
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                self.rebuild(json.load(f))
+            self.dirty = False
+            logger.info(f"📋 Loaded {len(self.chats)} chats from the dialog snapshot")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load dialog snapshot from {self.path}: {e}")
+
+    def save(self, force=False):
+        if not self.dirty or (not force and time.monotonic() - self.last_save < self.save_interval):
+            return
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(list(self.chats.values()), f)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+            self.last_save = time.monotonic()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save dialog snapshot to {self.path}: {e}")
+
+class MessageRange:
+    """
+    Message IDs as sorted, merged, inclusive (start, end) intervals. Iteration is lazy,
+    len() is constant-time and membership is a binary search, so /1-5000000 costs two
+    ints instead of five million
+    """
+    def __init__(self, intervals=()):
+        merged = []
+        for start, end in sorted((min(a, b), max(a, b)) for a, b in intervals):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self.intervals = [(start, end) for start, end in merged]
+        self.starts = [start for start, _ in self.intervals]
+        self.size = sum(end - start + 1 for start, end in self.intervals)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(range(start, end + 1) for start, end in self.intervals)
+
+    def __contains__(self, message_id):
+        index = bisect.bisect_right(self.starts, message_id) - 1
+        return index >= 0 and message_id <= self.intervals[index][1]
+
+    def __str__(self):
+        return ", ".join(f"{start}-{end}" if start != end else str(start) for start, end in self.intervals)
+
+    @property
+    def first(self):
+        return self.starts[0] if self.intervals else None
+
+    @property
+    def last(self):
+        return self.intervals[-1][1] if self.intervals else None
+
+    def clip(self, low=None, high=None):
+        """The IDs between low and high (inclusive)"""
+        return MessageRange(
+            (max(start, low) if low is not None else start, min(end, high) if high is not None else end)
+            for start, end in self.intervals
+            if (low is None or end >= low) and (high is None or start <= high)
+        )
+
+    def after(self, message_id):
+        """The IDs above message_id"""
+        return self.clip(low=message_id + 1)
+
+    def without(self, message_ids):
+        """The IDs not in message_ids (any iterable of IDs)"""
+        intervals = []
+        excluded = sorted(message_ids)
+        for start, end in self.intervals:
+            position = bisect.bisect_left(excluded, start)
+            while position < len(excluded) and excluded[position] <= end:
+                if excluded[position] > start:
+                    intervals.append((start, excluded[position] - 1))
+                start = excluded[position] + 1
+                position += 1
+            if start <= end:
+                intervals.append((start, end))
+        return MessageRange(intervals)
+
+    def chunks(self, size):
+        """Lazily yield lists of at most size IDs"""
+        ids = iter(self)
+        while True:
+            chunk = list(itertools.islice(ids, size))
+            if not chunk:
+                return
+            yield chunk
+
+class HistoryPager:
+    """
+    Pages a chat's history - or a single forum topic's thread, or only the messages matching
+    a search filter - in ascending ID order with raw GetHistory/GetReplies/Search, keeping up
+    to `prefetch` pages fetched ahead of the consumer. Only IDs inside `ids` (a MessageRange)
+    are yielded; its bounds are sent as min_id/max_id, so nothing outside them is transferred.
+    With a since/until date window (unix times) paging starts at `since` via offset_date
+    and stops at the first message from `until` on
+    """
+    def __init__(self, bot, chat_id, ids, topic_id=None, search_filter=None, since=None, until=None, prefetch=2, page_size=HISTORY_PAGE_SIZE):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.ids = ids
+        self.topic_id = topic_id
+        self.search_filter = search_filter
+        self.since = since
+        self.until = until
+        self.page_size = page_size
+        self.pages = asyncio.Queue(maxsize=max(1, prefetch))
+        self.first_page = []
+        self.count = None
+        self.task = None
+
+    def __len__(self):
+        """Messages expected - the server's count for the thread/chat, capped by the ID range"""
+        return len(self.ids) if self.count is None else min(len(self.ids), self.count)
+
+    @property
+    def total(self):
+        """Messages expected, or None when unknown - GetHistory/GetReplies count the whole chat/thread, not a date window"""
+        if (self.since or self.until) and not self.search_filter:
+            return None
+        return len(self)
+
+    async def _request(self, offset_id, offset_date=0):
+        """
+        One page of messages with IDs >= offset_id (or sent from offset_date on), oldest first,
+        plus the highest raw ID seen - None once the page reaches `until` or nothing is left
+        """
+        # Reverse paging: add_offset=-limit turns "older than offset_id" into "from offset_id up"
+        params = dict(
+            peer=await self.bot.app.resolve_peer(self.chat_id),
+            offset_id=offset_id,
+            add_offset=-self.page_size,
+            limit=self.page_size,
+            max_id=self.ids.last + 1,
+            min_id=max(offset_id, self.ids.first) - 1,
+            hash=0
+        )
+        if self.search_filter:
+            # Search takes the date window directly
+            query = raw.functions.messages.Search(
+                q='', filter=self.search_filter, min_date=self.since or 0, max_date=self.until or 0, top_msg_id=self.topic_id, **params
+            )
+        elif self.topic_id:
+            query = raw.functions.messages.GetReplies(msg_id=self.topic_id, offset_date=offset_date, **params)
+        else:
+            query = raw.functions.messages.GetHistory(offset_date=offset_date, **params)
+
+        result = await self.bot.tg('read', self.chat_id, self.bot.app.invoke, query)
+        if self.count is None:
+            self.count = getattr(result, 'count', len(result.messages))
+        if not result.messages:
+            return [], None
+
+        top = max(message.id for message in result.messages)
+        if self.until and max(getattr(message, 'date', 0) for message in result.messages) >= self.until:
+            top = None
+        messages = await utils.parse_messages(self.bot.app, result, replies=0)
+        page = sorted(
+            (message for message in messages if not message.empty and message.id in self.ids and self.in_window(message)),
+            key=lambda message: message.id
+        )
+        return page, top
+
+    def in_window(self, message):
+        timestamp = message.date.timestamp() if message.date else 0
+        return (not self.since or timestamp >= self.since) and (not self.until or timestamp < self.until)
+
+    async def start(self):
+        """Fetch the first page (so errors and the count surface here) and start prefetching"""
+        if not self.ids:
+            self.count = 0
+            return 0
+        if self.since and not self.search_filter:
+            # The first page starts at the window's first message, later pages follow by ID
+            self.first_page, top = await self._request(0, offset_date=self.since)
+        else:
+            self.first_page, top = await self._request(self.ids.first)
+        self.task = asyncio.create_task(self._prefetch(top))
+        return len(self)
+
+    async def _prefetch(self, top):
+        try:
+            while top is not None and top < self.ids.last:
+                page, top = await self._request(top + 1)
+                if page:
+                    await self.pages.put(page)
+        except Exception as e:
+            await self.pages.put(e)
+        await self.pages.put(None)
+
+    def close(self):
+        if self.task:
+            self.task.cancel()
+
+    async def __aiter__(self):
+        try:
+            if self.first_page:
+                yield self.first_page
+            while self.task:
+                page = await self.pages.get()
+                if page is None:
+                    return
+                if isinstance(page, Exception):
+                    raise page
+                yield page
+        finally:
+            self.close()
+
+class MergedPager:
+    """
+    Several ascending HistoryPagers (one per search filter) merged into one ascending
+    stream of pages - a message matched by more than one filter is yielded once
+    """
+    def __init__(self, pagers, page_size=HISTORY_PAGE_SIZE):
+        self.pagers = pagers
+        self.page_size = page_size
+
+    def __len__(self):
+        return sum(len(pager) for pager in self.pagers)
+
+    @property
+    def total(self):
+        totals = [pager.total for pager in self.pagers]
+        return None if None in totals else sum(totals)
+
+    async def start(self):
+        try:
+            for pager in self.pagers:
+                await pager.start()
+        except Exception:
+            self.close()
+            raise
+        return len(self)
+
+    def close(self):
+        for pager in self.pagers:
+            pager.close()
+
+    async def __aiter__(self):
+        streams = [pager.__aiter__() for pager in self.pagers]
+        buffers = [deque() for _ in streams]
+
+        async def fill(index):
+            while not buffers[index] and streams[index] is not None:
+                try:
+                    buffers[index].extend(await streams[index].__anext__())
+                except StopAsyncIteration:
+                    streams[index] = None
+
+        try:
+            for index in range(len(streams)):
+                await fill(index)
+
+            page = []
+            last_id = None  # Kept across pages, a duplicate can straddle a page boundary
+            while any(buffers):
+                index = min((i for i, buffer in enumerate(buffers) if buffer), key=lambda i: buffers[i][0].id)
+                message = buffers[index].popleft()
+                if message.id != last_id:
+                    page.append(message)
+                    last_id = message.id
+                await fill(index)
+                if len(page) >= self.page_size:
+                    yield page
+                    page = []
+            if page:
+                yield page
+        finally:
+            self.close()
+
 class SmartDiscoverBackupBot:
     def __init__(self):
         # Get environment variables
         self.api_id = int(os.getenv('API_ID'))
         self.api_hash = os.getenv('API_HASH')
         self.session_string = os.getenv('USER_SESSION_STRING')
-        self.dest_channel = int(os.getenv('DESTINATION_CHANNEL'))
-        self.min_delay = int(os.getenv('MIN_DELAY', '5'))
-        self.max_delay = int(os.getenv('MAX_DELAY', '15'))
+        # One or more comma-separated destinations - the first one receives the upload,
+        # the others get a server-side copy of it
+        self.dest_channels = [int(dest) for dest in os.getenv('DESTINATION_CHANNEL').split(',') if dest.strip()]
+        self.dest_channel = self.dest_channels[0]
         self.owner_id = int(os.getenv('OWNER_ID', '0'))
+
+        # Pipeline settings - download workers and queue bound (caps files on disk). There is
+        # always a single upload worker, so the destination receives items in fetch order
+        self.download_workers = int(os.getenv('DOWNLOAD_WORKERS', '2'))
+        self.pipeline_queue_size = int(os.getenv('PIPELINE_QUEUE_SIZE', '3'))
+
+        # Streaming relay for large media - no on-disk copy, upload overlaps download (0 disables)
+        self.relay_min_size = int(os.getenv('RELAY_MIN_SIZE', str(20 * 1024 * 1024)))
+        self.relay_buffer_parts = int(os.getenv('RELAY_BUFFER_PARTS', '8'))
+        self.relay_upload_workers = int(os.getenv('RELAY_UPLOAD_WORKERS', '2'))
+
+        # Persistent state (learned pacing, caches)
+        self.state_dir = os.getenv('STATE_DIR', 'state')
+        os.makedirs(self.state_dir, exist_ok=True)
+
+        # Rate limits per method class - calls only wait when over budget
+        self.pacing = PacingController(
+            os.path.join(self.state_dir, 'pacing.json'),
+            increase=float(os.getenv('PACING_INCREASE', '0.01')),
+            decrease=float(os.getenv('PACING_DECREASE', '0.5'))
+        )
+        self.rate_limiter = RateLimiter({
+            'read': (float(os.getenv('READ_RATE', '5')), int(os.getenv('READ_BURST', '10'))),
+            'send': (float(os.getenv('SEND_RATE', '0.5')), int(os.getenv('SEND_BURST', '5'))),
+            'edit': (float(os.getenv('EDIT_RATE', '0.2')), int(os.getenv('EDIT_BURST', '2'))),
+        }, self.pacing)
         
         # Create Pyrogram client
         self.app = Client(
@@ -47,13 +974,58 @@ class SmartDiscoverBackupBot:
         )
         
         # Backup control variables
-        self.active_backups = {}  # Track active backups by user_id
+        self.active_backups = {}  # Running backup jobs: job ID -> {'user_id', 'stop'}
         self.setup_handlers()
-        self.chat_cache = {}  # Cache for chat IDs
+        # Link chat ID -> resolved chat, so repeated backups skip get_chat entirely
+        self.chat_cache = ChatCache(
+            os.path.join(self.state_dir, 'chat_cache.json'),
+            ttl=int(os.getenv('CHAT_CACHE_TTL', str(7 * 24 * 3600)))
+        )
+        self.protected_chats = {}  # Cache of has_protected_content by chat ID
+
+        # Groups/channels the account is in, looked up locally instead of rescanning get_dialogs()
+        self.dialogs = DialogIndex(os.path.join(self.state_dir, 'dialogs.json'))
+        # History pages fetched ahead of the pipeline in topic/history paging modes
+        self.history_prefetch = int(os.getenv('HISTORY_PREFETCH', '2'))
+
+        # Chats probed in parallel when a link has to be matched against every dialog
+        self.probe_concurrency = int(os.getenv('PROBE_CONCURRENCY', '8'))
 
         # Create downloads directory if it doesn't exist
         self.downloads_dir = "downloads"
-        os.makedirs(self.downloads_dir, exist_ok=True)
+        self.spool = SpoolManager(
+            self.downloads_dir,
+            quota_bytes=int(os.getenv('SPOOL_QUOTA_BYTES', '0')),
+            min_free_bytes=int(os.getenv('SPOOL_MIN_FREE_BYTES', str(100 * 1024 * 1024)))
+        )
+        self.spool.clear_orphans()
+
+        # Backup jobs are checkpointed so they survive restarts
+        self.job_store = JobStore(os.path.join(self.state_dir, 'jobs.db'))
+
+        # Media already in the destination: skip it, re-send it by file_id, or turn the check off
+        self.media_index = MediaIndex(os.path.join(self.state_dir, 'media_index.db'))
+        self.dedup_mode = os.getenv('DEDUP_MODE', 'skip').lower()
+
+        # Uploaded file_ids are reused instead of uploading the same media again
+        self.file_id_cache = FileIdCache(
+            os.path.join(self.state_dir, 'file_ids.db'),
+            capacity=int(os.getenv('FILE_ID_CACHE_SIZE', '10000'))
+        )
+
+    async def tg(self, kind, peer, func, *args, **kwargs):
+        """Run a Telegram call through the shared rate limiter, waiting out FloodWaits"""
+        while True:
+            await self.rate_limiter.acquire(kind, peer)
+            try:
+                result = await func(*args, **kwargs)
+            except FloodWait as e:
+                logger.warning(f"🚫 Flood wait on {getattr(func, '__name__', 'call')} ({kind}:{peer}): {e.value}s")
+                # The next acquire waits out the pause at the lowered rate
+                self.rate_limiter.on_flood(kind, peer, e.value)
+                continue
+            self.rate_limiter.on_success(kind, peer)
+            return result
 
     def sanitize_filename(self, filename):
         """Sanitize filename to remove problematic characters"""
@@ -101,6 +1073,14 @@ class SmartDiscoverBackupBot:
         # Combined filter - private chat AND owner
         private_owner_filter = private_filter & owner_filter
 
+        # Keeps the dialog index fresh - runs before every other handler and never stops them
+        @self.app.on_message(filters.group | filters.channel, group=-1)
+        async def dialog_update_handler(client, message):
+            if message.left_chat_member and message.left_chat_member.is_self:
+                self.dialogs.remove(message.chat.id)
+            else:
+                self.dialogs.update(message.chat, message.date.timestamp() if message.date else None)
+
         @self.app.on_message(filters.command("tgprostart") & private_owner_filter)
         async def start_handler(client, message):
             await self.handle_start(message)
@@ -116,9 +1096,13 @@ class SmartDiscoverBackupBot:
         @self.app.on_message(filters.command("tgprostop") & private_owner_filter)
         async def stop_handler(client, message):
             await self.handle_stop(message)
+
+        @self.app.on_message(filters.command("resume") & private_owner_filter)
+        async def resume_handler(client, message):
+            await self.handle_resume(message)
         
         # COMPLETELY IGNORE all other commands - no response at all
-        @self.app.on_message(filters.command(["tgprostart", "tgprobackup", "tgprostop", "chats", "start", "backup", "stop"]))
+        @self.app.on_message(filters.command(["tgprostart", "tgprobackup", "tgprostop", "chats", "resume", "start", "backup", "stop"]))
         async def ignore_all_other_commands(client, message):
             # Simply return without doing anything - no response at all
             return
@@ -133,17 +1117,23 @@ class SmartDiscoverBackupBot:
 • Range: `/tgprobackup https://t.me/c/3166766661/4/10-16`
 • Multiple: `/tgprobackup https://t.me/c/3166766661/4/1,4,5-10`
 • Mixed: `/tgprobackup https://t.me/c/3166766661/4/1,3,5-8,10`
+• Whole topic: `/tgprobackup https://t.me/c/3166766661/4/all`
+• Whole chat: `/tgprobackup https://t.me/c/3166766661/all`
+• Filters: `/tgprobackup [link] type=video,document min_size=50MB caption~regex`
+• Date window: `/tgprobackup https://t.me/c/3166766661 since=2024-03-01 until=2024-03-31`
 
 ✅ **Preserves original captions exactly**
 ✅ **Handles all link formats**
 ✅ **Skips missing messages automatically**
 ✅ **Stop ongoing backups with /tgprostop**
 ✅ **Automatic filename sanitization**
+✅ **Interrupted backups resume automatically after a restart**
 
 **Commands:**
 `/tgprobackup [link]` - Backup messages
 `/tgprostop` - Stop ongoing backup (completes current message)
-`/chats` - List your available groups
+`/resume [job id]` - Resume stopped or interrupted backups
+`/chats [page|search|refresh]` - List, search or rescan your groups
 `/tgprostart` - Show this help
         """
         await message.reply(help_text)
@@ -151,36 +1141,50 @@ class SmartDiscoverBackupBot:
     async def handle_stop(self, message: Message):
         """Handle /tgprostop command"""
         user_id = message.from_user.id
-        
-        if user_id in self.active_backups:
-            self.active_backups[user_id] = False  # Set stop flag
+        running = [backup for backup in self.active_backups.values() if backup['user_id'] == user_id]
+
+        if running:
+            for backup in running:
+                backup['stop'] = True  # Set stop flag
             await message.reply("🛑 Stop signal received! Current message will complete, then backup will stop.")
             logger.info(f"🛑 Stop requested by user {user_id}")
         else:
             await message.reply("ℹ️ No active backup found to stop.")
 
     async def handle_chats(self, message: Message):
-        """List available chats"""
+        """List available chats - /chats [page|search|refresh]"""
         try:
-            await message.reply("🔍 Scanning your chats...")
-            chats = await self.get_user_chats()
-            
+            arg = " ".join(message.command[1:]).strip()
+            page = 1
+            if arg.lower() == 'refresh':
+                await message.reply("🔍 Scanning your chats...")
+                chats = await self.get_user_chats(refresh=True)
+            elif not arg or arg.isdigit():
+                page = int(arg or 1)
+                chats = await self.get_user_chats()
+            else:
+                if not self.dialogs.chats:
+                    await self.get_user_chats()
+                chats = self.dialogs.search(arg)
+
             if not chats:
                 await message.reply("❌ No groups/channels found in your dialogs")
                 return
-            
-            response = "📋 **Your Available Chats:**\n\n"
-            for chat in chats[:10]:  # Show first 10 to avoid message too long
+
+            pages = math.ceil(len(chats) / CHATS_PAGE_SIZE)
+            page = min(max(page, 1), pages)
+            response = f"📋 **Your Available Chats** (page {page}/{pages}, {len(chats)} total):\n\n"
+            for chat in chats[(page - 1) * CHATS_PAGE_SIZE:page * CHATS_PAGE_SIZE]:
                 response += f"**{chat['title']}**\n"
                 response += f"   🆔 `{chat['id']}`\n"
                 response += f"   👥 {chat['type']}\n"
                 if chat.get('username'):
                     response += f"   🔗 @{chat['username']}\n"
                 response += "\n"
-            
-            if len(chats) > 10:
-                response += f"... and {len(chats) - 10} more chats"
-            
+
+            if page < pages and (not arg or arg.isdigit()):
+                response += f"➡️ `/chats {page + 1}` for the next page"
+
             await message.reply(response)
             
         except Exception as e:
@@ -194,6 +1198,17 @@ class SmartDiscoverBackupBot:
                 return
 
             link = message.command[1]
+            try:
+                options = self.parse_backup_options(message.text.split(None, 2)[2] if len(message.command) > 2 else "")
+            except ValueError as e:
+                await message.reply(f"❌ {e}")
+                return
+
+            window = options.get('since') or options.get('until')
+            if self.is_bare_chat_link(link) and not window:
+                await message.reply(f"❌ A bare chat link needs a since=/until= window\nFor the whole chat use `{link.rstrip('/')}/all`")
+                return
+
             await message.reply(f"🔄 Processing: `{link}`\n🔍 Discovering correct chat ID...")
 
             # Extract message IDs and find correct chat - UPDATED FOR RANGES
@@ -208,23 +1223,205 @@ class SmartDiscoverBackupBot:
                 await message.reply("❌ Could not find the chat. Make sure you're a member and try `/chats` to see available chats.")
                 return
 
-            await message.reply(f"✅ Found: **{chat['title']}**\n📊 Starting backup of {len(message_ids)} messages...\n⚠️ Missing messages will be skipped automatically\n🛑 Use `/tgprostop` to stop ongoing backup")
+            # Nothing exists past the newest message - "1-99999" means "everything"
+            top_message_id = await self.chat_top_message_id(chat['id'])
+            if not top_message_id and message_ids.last == MAX_MESSAGE_ID:
+                # Without the chat's newest ID, "all" would walk ~2 billion IDs if paging fails
+                await message.reply("❌ Could not read the chat's last message, so `all` has no end. Try again, or give an ID range instead")
+                return
+            spec = {'link': link, 'max_id': top_message_id, 'options': options}
+            planned = message_ids.clip(high=top_message_id) if top_message_id else message_ids
+            clipped = len(message_ids) - len(planned)
+            if not planned:
+                await message.reply(f"❌ The chat's last message is {top_message_id}, nothing to back up in that range")
+                return
 
-            success_count, failed_count, missing_messages = await self.process_backup(chat, message_ids, message.chat.id, message.from_user.id)
-            
-            result_message = f"✅ Backup completed!\n📨 Processed: {success_count}/{len(message_ids)} messages from **{chat['title']}**"
-            
-            if failed_count > 0:
-                result_message += f"\n❌ Failed: {failed_count} messages"
-            
-            if missing_messages:
-                result_message += f"\n⚠️ Missing: {len(missing_messages)} messages (IDs: {', '.join(map(str, missing_messages[:10]))}{'...' if len(missing_messages) > 10 else ''})"
-            
-            await message.reply(result_message)
+            job_id = self.job_store.create(message.from_user.id, message.chat.id, chat, spec)
+
+            topic_id = self.extract_topic_id(link)
+            if topic_id:
+                plan = f"✅ Found: **{chat['title']}**\n📊 Starting backup job #{job_id} of topic {topic_id} (IDs {planned})..."
+            elif window:
+                # How many messages the window holds is only known once it has been paged
+                plan = f"✅ Found: **{chat['title']}**\n📊 Starting backup job #{job_id} over IDs {planned}..."
+            else:
+                plan = f"✅ Found: **{chat['title']}**\n📊 Starting backup job #{job_id} of {len(planned)} messages..."
+            if clipped:
+                plan += f"\n✂️ {clipped} IDs past the chat's last message ({top_message_id}) dropped"
+            if window:
+                plan += "\n📅 Only messages inside the since/until window are fetched"
+            await message.reply(f"{plan}\n⚠️ Missing messages will be skipped automatically\n🛑 Use `/tgprostop` to stop ongoing backup")
+
+            await self.run_backup_job(job_id)
 
         except Exception as e:
             await message.reply(f"❌ Backup failed: {str(e)}")
 
+    async def handle_resume(self, message: Message):
+        """Handle /resume command - resume one job by ID, or every unfinished job"""
+        try:
+            user_id = message.from_user.id
+            if len(message.command) > 1:
+                job = self.job_store.get(int(message.command[1]))
+                jobs = [job] if job and job['user_id'] == user_id and job['status'] != 'completed' else []
+            else:
+                jobs = self.job_store.unfinished(user_id, statuses=('running', 'stopped', 'failed'))
+            # A job that is already running (e.g. resumed on startup) is left alone
+            jobs = [job for job in jobs if job['id'] not in self.active_backups]
+
+            if not jobs:
+                await message.reply("ℹ️ No unfinished backup jobs to resume.")
+                return
+
+            await message.reply(f"🔄 Resuming {len(jobs)} backup job(s): {', '.join('#' + str(job['id']) for job in jobs)}")
+            for job in jobs:
+                await self.run_backup_job(job['id'])
+                if self.job_store.get(job['id'])['status'] == 'stopped':
+                    break
+
+        except Exception as e:
+            await message.reply(f"❌ Resume failed: {str(e)}")
+
+    async def resume_unfinished_jobs(self):
+        """Resume jobs that were still running when the process went down"""
+        for job in self.job_store.unfinished():
+            logger.info(f"🔄 Resuming interrupted backup job #{job['id']} from message {job['last_message_id']}")
+            try:
+                await self.app.send_message(job['user_chat_id'], f"🔄 Resuming interrupted backup job #{job['id']} from **{job['chat_title']}** (last message {job['last_message_id']})")
+            except Exception as e:
+                logger.warning(f"⚠️ Could not notify about resumed job #{job['id']}: {e}")
+            await self.run_backup_job(job['id'])
+
+    async def run_backup_job(self, job_id):
+        """Run (or continue) a stored backup job over the messages it has not committed yet"""
+        if job_id in self.active_backups:
+            logger.info(f"ℹ️ Backup job #{job_id} is already running")
+            return
+
+        job = self.job_store.get(job_id)
+        # Registered before the first await, so the same job never runs twice
+        self.active_backups[job_id] = {'user_id': job['user_id'], 'stop': False}
+        try:
+            await self._run_backup_job(job_id, job)
+        finally:
+            self.active_backups.pop(job_id, None)
+
+    async def _run_backup_job(self, job_id, job):
+        spec = json.loads(job['spec'])
+        chat = {'id': job['chat_id'], 'title': job['chat_title']}
+
+        requested = self.extract_message_ids_all_formats(spec['link']) or MessageRange()
+        all_ids = requested.clip(high=spec['max_id']) if spec.get('max_id') else requested
+        processed = self.job_store.processed_ids(job_id)
+        message_ids = all_ids.without(processed)
+        clipped = len(requested) - len(all_ids)
+        planned = len(all_ids)
+
+        # Forum topic links page through that topic's thread only, never other topics' IDs,
+        # type= filters are searched on the server so other media is never fetched, and
+        # a since=/until= window starts paging at its first message by date
+        options = spec.get('options') or {}
+        topic_id = self.extract_topic_id(spec['link'])
+        search_types = options.get('types') or []
+        window = {'since': options.get('since'), 'until': options.get('until')}
+        if topic_id or search_types or any(window.values()):
+            pagers = [
+                HistoryPager(self, chat['id'], message_ids, topic_id=topic_id, search_filter=SEARCH_FILTERS[media_type](), prefetch=self.history_prefetch, **window)
+                for media_type in search_types
+            ] or [HistoryPager(self, chat['id'], message_ids, topic_id=topic_id, prefetch=self.history_prefetch, **window)]
+            pager = pagers[0] if len(pagers) == 1 else MergedPager(pagers)
+            try:
+                await pager.start()
+                message_ids = pager
+                planned = None if pager.total is None else len(processed) + pager.total
+                clipped = 0
+            except Exception as e:
+                logger.warning(f"⚠️ Could not page {chat['id']} on the server side, backing up the ID range instead: {e}")
+                if topic_id:
+                    # The ID range spans every topic, so keep only this topic's messages
+                    options = {**options, 'topic_id': topic_id}
+
+        self.job_store.set_status(job_id, 'running')
+        try:
+            await self.process_backup(chat, message_ids, job['user_chat_id'], job['user_id'], job_id=job_id, clipped=clipped, options=options)
+        finally:
+            if not isinstance(message_ids, MessageRange):
+                message_ids.close()
+
+        job = self.job_store.get(job_id)
+        if job['status'] == 'failed':
+            # process_backup already reported the error; resolve the chat afresh next time
+            self.chat_cache.invalidate(self.extract_chat_id_from_link(spec['link']))
+            return
+        if job['status'] == 'running':
+            self.job_store.set_status(job_id, 'completed')
+
+        result_message = f"✅ Backup job #{job_id} {'stopped' if job['status'] == 'stopped' else 'completed'}!\n📨 Processed: {job['success']}/{'?' if planned is None else planned} messages from **{chat['title']}**"
+
+        if job['failed'] > 0:
+            result_message += f"\n❌ Failed: {job['failed']} messages"
+
+        if job['skipped']:
+            result_message += f"\n♻️ Duplicates skipped: {job['skipped']} messages"
+
+        if options:
+            result_message += f"\n🔎 Filtered out: {self.job_store.count_status(job_id, 'filtered')} messages"
+
+        if job['missing']:
+            missing_messages = self.job_store.missing_ids(job_id)
+            result_message += f"\n⚠️ Missing: {job['missing']} messages (IDs: {', '.join(map(str, missing_messages))}{'...' if job['missing'] > len(missing_messages) else ''})"
+
+        await self.app.send_message(job['user_chat_id'], result_message)
+
+    def parse_backup_options(self, text):
+        """
+        Parse the options after the link:
+        - type=video,document - only these media types (searched on the server)
+        - min_size=50MB - only media of at least this size
+        - since=2024-03-01 until=2024-03-31 - only messages sent in this window (UTC, until inclusive)
+        - caption~regex - only captions matching the regex (takes the rest of the line)
+        """
+        options = {}
+        text = text.strip()
+        if 'caption~' in text:
+            text, pattern = text.split('caption~', 1)
+            try:
+                re.compile(pattern.strip())
+            except re.error as e:
+                raise ValueError(f"Invalid caption regex: {e}")
+            options['caption'] = pattern.strip()
+
+        for token in text.split():
+            key, _, value = token.partition('=')
+            key = key.lower()
+            if key == 'type':
+                media_types = [media_type.strip().lower() for media_type in value.split(',') if media_type.strip()]
+                unknown = [media_type for media_type in media_types if media_type not in SEARCH_FILTERS]
+                if unknown or not media_types:
+                    raise ValueError(f"Unknown type {', '.join(unknown) or '(empty)'} - use {', '.join(SEARCH_FILTERS)}")
+                options['types'] = media_types
+            elif key == 'min_size':
+                match = re.fullmatch(r'(\d+(?:\.\d+)?)\s*([a-zA-Z]*)', value)
+                if not match or match.group(2).lower() not in SIZE_UNITS:
+                    raise ValueError(f"Invalid min_size {value} - use e.g. 500KB, 50MB or 2GB")
+                options['min_size'] = int(float(match.group(1)) * SIZE_UNITS[match.group(2).lower()])
+            elif key in ('since', 'until'):
+                try:
+                    moment = datetime.fromisoformat(value)
+                except ValueError:
+                    raise ValueError(f"Invalid {key} {value} - use YYYY-MM-DD or YYYY-MM-DDTHH:MM")
+                if moment.tzinfo is None:
+                    moment = moment.replace(tzinfo=timezone.utc)
+                if key == 'until' and len(value) == 10:
+                    # A bare date includes that whole day
+                    moment += timedelta(days=1)
+                options[key] = int(moment.timestamp())
+            else:
+                raise ValueError(f"Unknown option {token}")
+        if options.get('since') and options.get('until') and options['since'] >= options['until']:
+            raise ValueError("since= must be before until=")
+        return options
+
     def extract_message_ids_all_formats(self, link):
         """
         Extract message IDs from ALL formats including ranges:
@@ -232,12 +1429,14 @@ class SmartDiscoverBackupBot:
         - Range: https://t.me/c/3166766661/4/10-16
         - Multiple: https://t.me/c/3166766661/4/1,4,5-10
         - Mixed: https://t.me/c/3166766661/4/1,3,5-8,10
+        - Everything: https://t.me/c/3166766661/4/all (a whole forum topic, or chat without the topic)
+        - Bare chat: https://t.me/c/3166766661 (everything - /tgprobackup requires since=/until= with it)
         """
         try:
             if 't.me/c/' in link:
                 parts = link.split('/')
-                # Get the last part which contains message ID(s)
-                message_part = parts[-1]
+                # Get the last part which contains message ID(s) - a bare chat link means all of them
+                message_part = parts[-1] if len(link.split('/c/')[1].strip('/').split('/')) > 1 else 'all'
                 
                 logger.info(f"🔍 Parsing message part: {message_part}")
                 
@@ -245,7 +1444,7 @@ class SmartDiscoverBackupBot:
                 message_ids = self.parse_message_range(message_part)
                 
                 if message_ids:
-                    logger.info(f"✅ Extracted {len(message_ids)} message IDs: {message_ids[:10]}{'...' if len(message_ids) > 10 else ''}")
+                    logger.info(f"✅ Extracted {len(message_ids)} message IDs: {message_ids}")
                     return message_ids
             
             return None
@@ -254,56 +1453,55 @@ class SmartDiscoverBackupBot:
             return None
 
     def parse_message_range(self, range_str):
-        """Parse message range string into list of message IDs"""
+        """Parse message range string into a MessageRange of message IDs"""
         try:
-            message_ids = []
+            intervals = []
+
+            if range_str.strip().lower() == 'all':
+                # Clipped to the chat's newest message before the job starts
+                return MessageRange([(1, MAX_MESSAGE_ID)])
             
             # Handle comma-separated values
             parts = [part.strip() for part in range_str.split(',')]
             
             for part in parts:
                 if '-' in part:
-                    # Handle range like "10-16"
+                    # Handle range like "10-16" (a reversed range is swapped by MessageRange)
                     start_end = part.split('-')
                     if len(start_end) == 2 and start_end[0].isdigit() and start_end[1].isdigit():
-                        start = int(start_end[0])
-                        end = int(start_end[1])
-                        if start <= end:
-                            # Add all IDs in range
-                            message_ids.extend(range(start, end + 1))
-                        else:
-                            # Reverse range if start > end
-                            message_ids.extend(range(end, start + 1))
+                        intervals.append((int(start_end[0]), int(start_end[1])))
                 else:
                     # Handle single number like "18"
                     if part.isdigit():
-                        message_ids.append(int(part))
+                        intervals.append((int(part), int(part)))
             
-            # Remove duplicates and sort
-            message_ids = sorted(set(message_ids))
-            return message_ids
+            # Overlaps and duplicates are merged, IDs come out sorted
+            return MessageRange(intervals)
             
         except Exception as e:
             logger.error(f"Error parsing range {range_str}: {e}")
-            return []
+            return MessageRange()
 
-    async def get_user_chats(self):
-        """Get all groups/channels user is member of"""
+    async def get_user_chats(self, refresh=False):
+        """Get all groups/channels user is member of, from the dialog index (scanned once if empty)"""
+        if refresh or not self.dialogs.chats:
+            await self.refresh_dialogs()
+        return self.dialogs.all()
+
+    async def refresh_dialogs(self):
+        """Walk get_dialogs() once and rebuild the dialog index from it"""
         try:
-            chats = []
+            entries = []
             async for dialog in self.app.get_dialogs():
                 chat = dialog.chat
-                if chat.type in ["group", "supergroup", "channel"]:
-                    chats.append({
-                        'id': chat.id,
-                        'title': chat.title,
-                        'type': chat.type,
-                        'username': getattr(chat, 'username', None)
-                    })
-            return chats
+                if chat.type in DialogIndex.CHAT_TYPES:
+                    top_message = dialog.top_message
+                    last_activity = top_message.date.timestamp() if top_message and top_message.date else 0
+                    entries.append(DialogIndex.entry(chat, last_activity))
+            self.dialogs.rebuild(entries)
+            self.dialogs.save(force=True)
         except Exception as e:
             logger.error(f"Error getting user chats: {e}")
-            return []
 
     async def find_correct_chat(self, link, user_chat_id):
         """Find the correct chat by trying different methods"""
@@ -311,6 +1509,19 @@ class SmartDiscoverBackupBot:
             # Method 1: Extract chat ID from link and try different formats
             link_chat_id = self.extract_chat_id_from_link(link)
             if link_chat_id:
+                cached = self.chat_cache.get(link_chat_id)
+                if cached:
+                    logger.info(f"💾 Using cached chat {cached['id']}: {cached['title']}")
+                    return cached
+
+                # Channels and supergroups in links drop the -100 prefix
+                indexed = self.dialogs.get(int(f"-100{link_chat_id}")) if link_chat_id.isdigit() else None
+                if indexed:
+                    logger.info(f"📋 Found chat {indexed['id']} in the dialog index: {indexed['title']}")
+                    found = {'id': indexed['id'], 'title': indexed['title'], 'type': indexed['type']}
+                    self.chat_cache.put(link_chat_id, indexed['id'], found)
+                    return found
+
                 # Try different formats
                 formats_to_try = [
                     f"-100{link_chat_id}",  # Most common format
@@ -320,14 +1531,16 @@ class SmartDiscoverBackupBot:
                 
                 for chat_id in formats_to_try:
                     try:
-                        chat = await self.app.get_chat(chat_id)
+                        chat = await self.tg('read', chat_id, self.app.get_chat, chat_id)
                         if chat:
                             logger.info(f"✅ Found chat with ID {chat_id}: {chat.title}")
-                            return {
+                            found = {
                                 'id': chat.id,
                                 'title': chat.title,
                                 'type': chat.type
                             }
+                            self.chat_cache.put(link_chat_id, chat_id, found)
+                            return found
                     except Exception as e:
                         logger.info(f"❌ Failed with ID {chat_id}: {e}")
                         continue
@@ -339,16 +1552,13 @@ class SmartDiscoverBackupBot:
             # Try to find a message in each chat to verify access
             message_ids = self.extract_message_ids_all_formats(link)
             if message_ids:
-                first_message_id = message_ids[0]
-                for chat in user_chats:
-                    try:
-                        # Try to get the first message to verify access
-                        message = await self.app.get_messages(chat['id'], first_message_id)
-                        if message and not getattr(message, "empty", False):
-                            logger.info(f"✅ Verified chat {chat['title']} has message {first_message_id}")
-                            return chat
-                    except Exception:
-                        continue
+                first_message_id = message_ids.first
+                chat = await self.probe_chats(self.probe_order(user_chats, link_chat_id), first_message_id)
+                if chat:
+                    logger.info(f"✅ Verified chat {chat['title']} has message {first_message_id}")
+                    if link_chat_id:
+                        self.chat_cache.put(link_chat_id, chat['id'], chat)
+                    return chat
 
             # Method 3: Ask user to forward a message
             await self.app.send_message(
@@ -362,6 +1572,57 @@ class SmartDiscoverBackupBot:
             logger.error(f"Error finding correct chat: {e}")
             return None
 
+    def probe_order(self, chats, link_chat_id):
+        """Chats whose ID ends with the link's chat ID go first, then the most recently active"""
+        suffix = str(link_chat_id) if link_chat_id else None
+        return sorted(
+            chats,
+            key=lambda chat: (not (suffix and str(abs(chat['id'])).endswith(suffix)), -chat.get('last_activity', 0))
+        )
+
+    async def probe_chats(self, candidates, message_id):
+        """
+        Ask up to probe_concurrency chats at once whether they have message_id. Answers are
+        taken in candidate order, not arrival order, so the best-ranked chat that has it wins;
+        the remaining probes are cancelled as soon as it is known
+        """
+        semaphore = asyncio.Semaphore(self.probe_concurrency)
+
+        async def probe(chat):
+            async with semaphore:
+                try:
+                    message = await self.tg('read', chat['id'], self.app.get_messages, chat['id'], message_id)
+                except Exception:
+                    return None
+                return chat if message and not getattr(message, "empty", False) else None
+
+        tasks = [asyncio.create_task(probe(chat)) for chat in candidates]
+        try:
+            for task in tasks:
+                chat = await task
+                if chat:
+                    return chat
+            return None
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def is_bare_chat_link(self, link):
+        """Whether a t.me/c/ link names only the chat, without message IDs"""
+        return 't.me/c/' in link and len(link.split('/c/')[1].split('?')[0].strip('/').split('/')) == 1
+
+    def extract_topic_id(self, link):
+        """Extract the forum topic ID from a t.me/c/<chat>/<topic>/<messages> link"""
+        try:
+            if 't.me/c/' in link:
+                parts = link.split('/c/')[1].split('?')[0].split('/')
+                if len(parts) == 3 and parts[1].isdigit():
+                    return int(parts[1])
+            return None
+        except:
+            return None
+
     def extract_chat_id_from_link(self, link):
         """Extract chat ID from link"""
         try:
@@ -373,182 +1634,973 @@ class SmartDiscoverBackupBot:
         except:
             return None
 
-    async def process_backup(self, chat, message_ids, user_chat_id, user_id):
-        """Process backup - SKIPS MISSING MESSAGES AND CAN BE STOPPED"""
+    async def chat_top_message_id(self, chat_id):
+        """The newest message ID in a chat, from a one-message read of the head of its history (None if unknown)"""
         try:
-            total = len(message_ids)
-            success_count = 0
-            failed_count = 0
-            missing_messages = []
+            history = await self.tg(
+                'read',
+                chat_id,
+                self.app.invoke,
+                raw.functions.messages.GetHistory(
+                    peer=await self.app.resolve_peer(chat_id),
+                    offset_id=0,
+                    offset_date=0,
+                    add_offset=0,
+                    limit=1,
+                    max_id=0,
+                    min_id=0,
+                    hash=0
+                )
+            )
+            messages = getattr(history, 'messages', [])
+            return messages[0].id if messages else None
+        except Exception as e:
+            logger.warning(f"⚠️ Could not read the newest message of {chat_id}, not clipping the range: {e}")
+            return None
 
-            # Set active backup flag for this user
-            self.active_backups[user_id] = True
+    async def fetch_messages_chunk(self, chat_id, chunk_ids):
+        """Fetch up to FETCH_BATCH_SIZE messages in one call, keyed by ID (missing ones are left out)"""
+        messages = await self.tg('read', chat_id, self.app.get_messages, chat_id, chunk_ids)
 
-            status_msg = await self.app.send_message(user_chat_id, f"📊 Processing {total} messages from **{chat['title']}**...\n⏳ Checking messages...\n🛑 Use `/tgprostop` to stop")
+        fetched = {}
+        for message in messages or []:
+            if message and not getattr(message, "empty", False):
+                fetched[message.id] = message
+        return fetched
 
-            for i, msg_id in enumerate(message_ids, 1):
-                # Check if stop was requested
-                if not self.active_backups.get(user_id, True):
-                    await status_msg.edit_text(f"🛑 Backup stopped by user!\n📊 Progress: {i-1}/{total}\n✅ Success: {success_count}\n⚠️ Missing: {len(missing_messages)}\n❌ Failed: {failed_count}")
-                    logger.info(f"🛑 Backup stopped by user {user_id} at message {msg_id}")
-                    break
+    async def process_backup(self, chat, message_ids, user_chat_id, user_id, job_id=None, clipped=0, options=None):
+        """
+        Process backup - SKIPS MISSING MESSAGES AND CAN BE STOPPED
 
-                try:
-                    # Get message with error handling for missing messages
-                    try:
-                        message = await self.app.get_messages(chat['id'], msg_id)
-                        
-                        if message and not getattr(message, "empty", False):
-                            # Safety delay
-                            delay = random.randint(self.min_delay, self.max_delay)
-                            await asyncio.sleep(delay)
-
-                            # Check again if stop was requested during delay
-                            if not self.active_backups.get(user_id, True):
-                                await status_msg.edit_text(f"🛑 Backup stopped by user!\n📊 Progress: {i-1}/{total}\n✅ Success: {success_count}\n⚠️ Missing: {len(missing_messages)}\n❌ Failed: {failed_count}")
-                                logger.info(f"🛑 Backup stopped by user {user_id} during delay before message {msg_id}")
-                                break
-
-                            # Backup message WITH ORIGINAL CAPTION
-                            await self.backup_single_message_exact(message, chat)
-                            success_count += 1
-
-                            logger.info(f"✅ Backed up message {msg_id} from {chat['title']}")
-                        else:
-                            # Message is empty or not found
-                            missing_messages.append(msg_id)
-                            logger.warning(f"⚠️ Message {msg_id} not found in {chat['title']}")
-                            
-                    except Exception as msg_error:
-                        # Handle missing messages specifically
-                        if "MESSAGE_ID_INVALID" in str(msg_error) or "MESSAGE_NOT_FOUND" in str(msg_error):
-                            missing_messages.append(msg_id)
-                            logger.warning(f"⚠️ Message {msg_id} not found in {chat['title']}")
-                        else:
-                            # Other errors
-                            failed_count += 1
-                            logger.error(f"❌ Message {msg_id} failed: {msg_error}")
-
-                    # Progress update - show current status
-                    progress = f"📊 Progress: {i}/{total}\n✅ Success: {success_count}\n⚠️ Missing: {len(missing_messages)}\n❌ Failed: {failed_count}\n🛑 Use `/tgprostop` to stop"
-                    
-                    # Update status every 5 messages or if it's the last message to avoid too many updates
-                    if i % 5 == 0 or i == total:
-                        await status_msg.edit_text(progress)
-
-                except FloodWait as e:
-                    logger.warning(f"🚫 Flood wait: {e.value}s")
-                    await asyncio.sleep(e.value + 5)
-                    # Retry the same message after flood wait
-                    i -= 1  # Decrement counter to retry same message
-                except Exception as e:
-                    failed_count += 1
-                    logger.error(f"❌ Message {msg_id} failed with unexpected error: {e}")
-                    # Continue with next message instead of stopping
+        Runs as a staged pipeline (fetch -> download -> upload -> cleanup)
+        connected by bounded queues, so the next downloads overlap with the
+        current upload while the number of files on disk stays capped.
+        """
+        try:
+            # A date-window pager can't tell its size up front - progress then shows "?" as the total
+            total = len(message_ids) if isinstance(message_ids, MessageRange) else message_ids.total
+
+            clipped_note = f"\n✂️ {clipped} IDs past the end of the chat skipped" if clipped else ""
+            status_msg = await self.app.send_message(user_chat_id, f"📊 Processing {'?' if total is None else total} messages from **{chat['title']}**...{clipped_note}\n⏳ Checking messages...\n🛑 Use `/tgprostop` to stop")
 
-            # Clear the active backup flag
-            if user_id in self.active_backups:
-                del self.active_backups[user_id]
+            job = {
+                'id': job_id,
+                'chat': chat,
+                'user_id': user_id,
+                'total': total,
+                'processed': 0,
+                'reported': 0,
+                'success': 0,
+                'failed': 0,
+                'missing': [],
+                'skipped': 0,
+                'filtered': 0,
+                'options': options or {},
+                'seen_media': set(),
+                'results': [],
+                'status_msg': status_msg,
+                'download_queue': asyncio.Queue(maxsize=self.pipeline_queue_size),
+                'upload_queue': asyncio.Queue(maxsize=self.pipeline_queue_size),
+                'cleanup_queue': asyncio.Queue(),
+            }
 
-            return success_count, failed_count, missing_messages
+            downloaders = [asyncio.create_task(self._download_worker(job)) for _ in range(self.download_workers)]
+            uploader = asyncio.create_task(self._upload_worker(job))
+            cleaner = asyncio.create_task(self._cleanup_worker(job))
+
+            try:
+                await self._fetch_stage(job, message_ids)
+            finally:
+                # Sentinels let every worker drain its queue and exit
+                for _ in downloaders:
+                    await job['download_queue'].put(None)
+                await job['upload_queue'].put(None)
+                await asyncio.gather(*downloaders, uploader)
+                await job['cleanup_queue'].put(None)
+                await cleaner
+
+            if self.is_backup_stopped(job):
+                if job_id:
+                    self.job_store.set_status(job_id, 'stopped')
+                await self.tg('edit', user_chat_id, status_msg.edit_text, f"🛑 Backup stopped by user!\n📊 Progress: {job['processed']}/{'?' if total is None else total}\n✅ Success: {job['success']}\n⚠️ Missing: {len(job['missing'])}\n❌ Failed: {job['failed']}")
+                logger.info(f"🛑 Backup stopped by user {user_id} after {job['processed']}/{total} messages")
+            elif job['processed'] != job['reported']:
+                # The total may be unknown or off, so the final count is always shown
+                await self._report_progress(job)
+
+            return job['success'], job['failed'], job['missing']
                 
         except Exception as e:
             logger.error(f"Backup process error: {e}")
-            # Clear the active backup flag on error
-            if user_id in self.active_backups:
-                del self.active_backups[user_id]
+            if job_id:
+                self.job_store.set_status(job_id, 'failed')
             await self.app.send_message(user_chat_id, f"❌ Backup error: {str(e)}")
             return 0, 0, []
 
-    async def backup_single_message_exact(self, message, chat):
-        """Backup a single message with EXACT original caption"""
+    def _record(self, job, msg_id, status):
+        """Count a per-message result (done / failed / missing / skipped / filtered) for the next checkpoint"""
+        job['processed'] += 1
+        if status == 'done':
+            job['success'] += 1
+        elif status == 'failed':
+            job['failed'] += 1
+        elif status == 'skipped':
+            job['skipped'] += 1
+        elif status == 'filtered':
+            job['filtered'] += 1
+        else:
+            job['missing'].append(msg_id)
+        job['results'].append((msg_id, status))
+
+    def _checkpoint(self, job):
+        """Commit recorded results to the job store"""
+        if job['id'] and job['results']:
+            try:
+                self.job_store.checkpoint(job['id'], job['results'])
+            except Exception as e:
+                logger.error(f"❌ Could not checkpoint job #{job['id']}: {e}")
+        job['results'] = []
+
+    def is_backup_stopped(self, job):
+        """Check if stop was requested for this job"""
+        return self.active_backups.get(job['id'], {}).get('stop', False)
+
+    async def _fetch_chunks(self, job, message_ids):
+        """
+        Yield (chunk IDs, {id: message}) - batch-fetched by ID for a MessageRange,
+        or page by page as a HistoryPager/MergedPager returns them
+        """
+        chat = job['chat']
+
+        if not isinstance(message_ids, MessageRange):
+            async for page in message_ids:
+                yield [message.id for message in page], {message.id: message for message in page}
+            return
+
+        for chunk_ids in message_ids.chunks(FETCH_BATCH_SIZE):
+            if self.is_backup_stopped(job):
+                return
+
+            # Fetch the whole chunk in one round trip
+            try:
+                fetched = await self.fetch_messages_chunk(chat['id'], chunk_ids)
+            except Exception as fetch_error:
+                if "MESSAGE_ID_INVALID" in str(fetch_error) or "MESSAGE_NOT_FOUND" in str(fetch_error):
+                    fetched = {}
+                else:
+                    logger.error(f"❌ Messages {chunk_ids[0]}-{chunk_ids[-1]} failed to fetch: {fetch_error}")
+                    for msg_id in chunk_ids:
+                        await job['upload_queue'].put({'id': msg_id, 'message': None, 'error': fetch_error})
+                    continue
+
+            yield chunk_ids, fetched
+
+    async def _fetch_stage(self, job, message_ids):
+        """Fetch stage - batch-fetch messages and feed the download and upload queues in order"""
+        chat = job['chat']
+
+        # Unprotected sources are copied server-side instead of downloaded
+        protected = await self.is_protected_chat(chat['id'])
+        pending_copies = []
+        pending_album = []
+
+        async for chunk_ids, fetched in self._fetch_chunks(job, message_ids):
+            if self.is_backup_stopped(job):
+                return
+
+            for msg_id in chunk_ids:
+                if self.is_backup_stopped(job):
+                    return
+
+                message = fetched.get(msg_id)
+                if not message:
+                    # Missing IDs never break up a bulk batch or an album
+                    await job['upload_queue'].put({'id': msg_id, 'message': None, 'download': None})
+                    continue
+
+                # Filtered-out messages are decided on metadata alone, before any transfer
+                if not self.matches_options(message, job['options']):
+                    await job['upload_queue'].put({'id': msg_id, 'message': message, 'download': None, 'filtered': True})
+                    continue
+
+                # Media that already reached the destination costs no transfer at all
+                duplicate = self.find_duplicate(job, message)
+                if duplicate:
+                    if self.dedup_mode == 'resend':
+                        await self._flush_bulk_copies(job, pending_copies)
+                        await self._queue_album(job, pending_album)
+                    await job['upload_queue'].put({'id': msg_id, 'message': message, 'download': None, 'duplicate': duplicate})
+                    continue
+
+                if not protected and not getattr(message, 'has_protected_content', False):
+                    # Contiguous copyable messages go out together in one bulk call
+                    await self._queue_album(job, pending_album)
+                    pending_copies.append(message)
+                    if len(pending_copies) >= FORWARD_BATCH_SIZE:
+                        await self._flush_bulk_copies(job, pending_copies, keep_open_album=True)
+                    continue
+
+                await self._flush_bulk_copies(job, pending_copies)
+
+                # Albums are collected by media_group_id and sent as one unit
+                if pending_album and pending_album[0].media_group_id != message.media_group_id:
+                    await self._queue_album(job, pending_album)
+                if message.media_group_id:
+                    pending_album.append(message)
+                    continue
+
+                # Media uploaded before is sent by file_id - no download, no upload
+                file_id = self.cached_file_id(message)
+                await self._queue_item(job, {
+                    'id': msg_id,
+                    'message': message,
+                    'download': None,
+                    'relay': not file_id and self.should_relay(message),
+                    'file_ids': [file_id] if file_id else None,
+                })
+
+        await self._flush_bulk_copies(job, pending_copies)
+        await self._queue_album(job, pending_album)
+
+    async def _queue_item(self, job, item):
+        """Queue an item for upload, and for download first if it carries media"""
+        if item.get('relay') or item.get('file_ids'):
+            # Relayed media is streamed by the upload stage itself, cached media needs no transfer
+            pass
+        elif (item['message'] and item['message'].media) or item.get('album'):
+            # Spool space is reserved here, in pipeline order and for a whole album at once,
+            # so no download can hold space that an earlier one (whose upload it queues behind) needs
+            messages = item.get('album') or [item['message']]
+            sizes = [self.media_size(message) for message in messages]
+            try:
+                await self.spool.reserve(sum(sizes))
+            except SpoolFullError as e:
+                if item.get('album'):
+                    logger.warning(f"⚠️ Album {messages[0].media_group_id} does not fit the spool, sending its items one by one: {e}")
+                    for message in messages:
+                        await self._queue_item(job, {
+                            'id': message.id,
+                            'message': message,
+                            'download': None,
+                            'relay': self.should_relay(message),
+                        })
+                    return
+                if self.can_relay(item['message']):
+                    logger.warning(f"⚠️ Message {item['id']} does not fit the spool, relaying it instead: {e}")
+                    item['relay'] = True
+                else:
+                    logger.error(f"❌ Message {item['id']} does not fit the spool: {e}")
+                    item['error'] = e
+                await job['upload_queue'].put(item)
+                return
+
+            # The upload stage waits on this future, keeping destination order intact
+            item['reserved'] = sizes
+            item['download'] = asyncio.get_running_loop().create_future()
+            await job['download_queue'].put(item)
+
+        await job['upload_queue'].put(item)
+
+    async def _queue_album(self, job, pending_album):
+        """Queue the collected album messages as a single album item"""
+        if pending_album:
+            file_ids = [self.cached_file_id(message) for message in pending_album]
+            await self._queue_item(job, {
+                'id': pending_album[0].id,
+                'message': None,
+                'download': None,
+                'album': list(pending_album),
+                'file_ids': file_ids if all(file_ids) else None,
+            })
+            pending_album.clear()
+
+    async def _flush_bulk_copies(self, job, pending_copies, keep_open_album=False):
+        """Queue the collected copyable messages as a single bulk item"""
+        batch = list(pending_copies)
+
+        # Don't split an album that may continue in the next batch
+        if keep_open_album and batch and batch[-1].media_group_id:
+            album_start = len(batch)
+            while album_start > 0 and batch[album_start - 1].media_group_id == batch[-1].media_group_id:
+                album_start -= 1
+            if album_start > 0:
+                batch = batch[:album_start]
+
+        if batch:
+            await job['upload_queue'].put({
+                'id': batch[0].id,
+                'message': None,
+                'download': None,
+                'bulk': batch,
+            })
+            del pending_copies[:len(batch)]
+
+    async def _download_worker(self, job):
+        """Download stage - resolve each item's download future with local file path(s)"""
+        while True:
+            item = await job['download_queue'].get()
+            if item is None:
+                return
+
+            future = item['download']
+            if self.is_backup_stopped(job):
+                await self.spool.release(sum(item['reserved']))
+                future.set_result(None)
+                continue
+
+            try:
+                if item.get('album'):
+                    future.set_result(await self.download_album(item['album'], item['reserved']))
+                else:
+                    future.set_result(await self.download_media(item['message'], item['reserved'][0]))
+            except Exception as e:
+                future.set_exception(e)
+
+    async def _upload_worker(self, job):
+        """Upload stage (one worker) - send items in fetch order, checkpoint them and hand downloaded files to cleanup"""
+        chat = job['chat']
+
+        while True:
+            item = await job['upload_queue'].get()
+            if item is None:
+                return
+
+            msg_id = item['id']
+            message = item['message']
+            downloaded = None
+
+            try:
+                if item.get('download') is not None:
+                    try:
+                        downloaded = await item['download']
+                    except Exception as download_error:
+                        logger.error(f"❌ Download of message {msg_id} failed: {download_error}")
+
+                # Once stopped, only drain the queue so downloaded files get cleaned up
+                if self.is_backup_stopped(job):
+                    continue
+
+                if item.get('error'):
+                    self._record(job, msg_id, 'failed')
+                elif item.get('filtered'):
+                    self._record(job, msg_id, 'filtered')
+                elif item.get('duplicate'):
+                    known = item['duplicate']
+                    file_id = next((row['file_id'] for row in known.values() if row['file_id']), None)
+                    if self.dedup_mode == 'resend':
+                        targets = self.dest_channels
+                    else:
+                        targets = [dest for dest in self.dest_channels if dest not in known]
+
+                    if targets and file_id:
+                        # Only the destinations still missing the media get it, by file_id
+                        for dest in targets:
+                            sent = await self.tg('send', dest, self.app.send_cached_media, dest, file_id, caption=self.get_original_caption(message))
+                            self.index_sent([(message, sent)], dest)
+                        self._record(job, msg_id, 'done')
+                        logger.info(f"♻️ Re-sent known media of message {msg_id} by file_id to {len(targets)} destination(s)")
+                    else:
+                        self._record(job, msg_id, 'skipped')
+                        logger.info(f"♻️ Skipped message {msg_id}, its media is already in the destination(s)")
+                elif item.get('bulk'):
+                    failed_messages, sent_pairs = await self.bulk_copy(item['bulk'], chat['id'])
+                    await self.fan_out(sent_pairs)
+                    failed_ids = {failed_message.id for failed_message in failed_messages}
+                    for bulk_message in item['bulk']:
+                        if bulk_message.id not in failed_ids:
+                            self._record(job, bulk_message.id, 'done')
+
+                    # Re-queue whatever the bulk call rejected through the per-message path, albums as one unit
+                    for group_id, group in itertools.groupby(failed_messages, key=lambda m: m.media_group_id or f"single-{m.id}"):
+                        group = list(group)
+                        try:
+                            if group[0].media_group_id:
+                                sent = await self.copy_album(group, chat)
+                            else:
+                                sent = [await self.copy_exact(group[0], chat)]
+                            await self.fan_out(zip(group, sent))
+                            status = 'done'
+                        except Exception as e:
+                            status = 'failed'
+                            logger.error(f"❌ Message {group[0].id} failed: {e}")
+                        for group_message in group:
+                            self._record(job, group_message.id, status)
+
+                    logger.info(f"✅ Bulk copied messages {item['bulk'][0].id}-{item['bulk'][-1].id} from {chat['title']}")
+                elif item.get('file_ids'):
+                    messages = item.get('album') or [message]
+                    sent = await self.send_by_file_ids(messages, item['file_ids'], chat)
+                    await self.fan_out(zip(messages, sent))
+                    for sent_message in messages:
+                        self._record(job, sent_message.id, 'done')
+
+                    logger.info(f"✅ Re-sent message {msg_id} from cached file_id(s) without any transfer")
+                elif item.get('album'):
+                    sent = await self.send_album_exact(item['album'], downloaded or [])
+                    await self.fan_out(zip(item['album'], sent))
+                    for album_message in item['album']:
+                        self._record(job, album_message.id, 'done')
+
+                    logger.info(f"✅ Backed up album {item['album'][0].media_group_id} ({len(item['album'])} items) from {chat['title']}")
+                elif message and item.get('relay'):
+                    await self.fan_out([(message, await self.relay_exact(message, chat))])
+                    self._record(job, msg_id, 'done')
+
+                    logger.info(f"✅ Relayed message {msg_id} from {chat['title']}")
+                elif message:
+                    # Backup message WITH ORIGINAL CAPTION
+                    await self.fan_out([(message, await self.send_exact(message, downloaded))])
+                    self._record(job, msg_id, 'done')
+
+                    logger.info(f"✅ Backed up message {msg_id} from {chat['title']}")
+                else:
+                    # Message is empty or not found
+                    self._record(job, msg_id, 'missing')
+                    logger.warning(f"⚠️ Message {msg_id} not found in {chat['title']}")
+
+            except Exception as e:
+                # Results are checkpointed per item, so anything recorded so far belongs to this one
+                recorded = {result_id for result_id, _ in job['results']}
+                for failed_message in item.get('bulk') or item.get('album') or [message]:
+                    failed_id = failed_message.id if failed_message else msg_id
+                    if failed_id not in recorded:
+                        self._record(job, failed_id, 'failed')
+                logger.error(f"❌ Message {msg_id} failed with unexpected error: {e}")
+                # Continue with next message instead of stopping
+            finally:
+                for file_path in (downloaded if isinstance(downloaded, list) else [downloaded]):
+                    if file_path:
+                        await job['cleanup_queue'].put(file_path)
+
+            # Checkpoint after every item so a restart resumes right after it
+            self._checkpoint(job)
+
+            # Update status every 5 messages or if it's the last message to avoid too many updates
+            if job['processed'] - job['reported'] >= 5 or job['processed'] == job['total']:
+                await self._report_progress(job)
+
+    async def _report_progress(self, job):
+        """Edit the job's status message with the current counters"""
+        job['reported'] = job['processed']
+        total = '?' if job['total'] is None else job['total']
+        progress = f"📊 Progress: {job['processed']}/{total}\n✅ Success: {job['success']}\n♻️ Duplicates: {job['skipped']}\n⚠️ Missing: {len(job['missing'])}\n❌ Failed: {job['failed']}\n🛑 Use `/tgprostop` to stop"
         try:
-            # PRESERVE ORIGINAL CAPTION EXACTLY - NO ADDED METADATA
-            original_caption = message.caption or ""
-            
-            # For text messages without media, use the text as caption
-            if not message.media and message.text:
-                original_caption = message.text
+            await self.tg('edit', job['status_msg'].chat.id, job['status_msg'].edit_text, progress)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not update progress: {e}")
+
+    async def _cleanup_worker(self, job):
+        """Cleanup stage - delete files once they have been uploaded"""
+        while True:
+            file_path = await job['cleanup_queue'].get()
+            if file_path is None:
+                return
+
+            await self.spool.discard(file_path)
+
+    def media_of(self, message):
+        """The media object (video, photo, document, ...) of a message, if any"""
+        return getattr(message, message.media.value, None) if message and message.media else None
+
+    def media_size(self, message):
+        return getattr(self.media_of(message), 'file_size', None) or 0
+
+    def matches_options(self, message, options):
+        """Check a message against the job's type/min_size/caption options using its metadata only"""
+        if not options:
+            return True
+        if options.get('topic_id') and not self.in_topic(message, options['topic_id']):
+            return False
+        if options.get('types') and (not message.media or message.media.value not in options['types']):
+            return False
+        if options.get('min_size') and (getattr(self.media_of(message), 'file_size', 0) or 0) < options['min_size']:
+            return False
+        if options.get('caption') and not re.search(options['caption'], message.caption or message.text or ''):
+            return False
+        timestamp = message.date.timestamp() if message.date else 0
+        if (options.get('since') and timestamp < options['since']) or (options.get('until') and timestamp >= options['until']):
+            return False
+        return True
+
+    def in_topic(self, message, topic_id):
+        """Whether a message belongs to a forum topic - the topic's first message, a post in it, or a reply inside it"""
+        if message.id == topic_id:
+            return True
+        thread_ids = (getattr(message, 'message_thread_id', None), message.reply_to_top_message_id, message.reply_to_message_id)
+        return topic_id in thread_ids
+
+    def find_duplicate(self, job, message):
+        """
+        Look up a message's media in the dedup index of every destination before anything
+        is downloaded. Returns {destination: index row} for the destinations that have it
+        """
+        file_unique_id = getattr(self.media_of(message), 'file_unique_id', None)
+        if not file_unique_id or self.dedup_mode == 'off':
+            return None
+
+        known = {}
+        for dest in self.dest_channels:
+            row = self.media_index.lookup(file_unique_id, dest)
+            if row:
+                known[dest] = row
+        if not known and file_unique_id in job['seen_media'] and self.dedup_mode == 'skip':
+            # Repeated inside this job, before the first copy was indexed
+            known = {dest: {'dest_message_id': None, 'file_id': None} for dest in self.dest_channels}
+        job['seen_media'].add(file_unique_id)
+        return known or None
+
+    async def fan_out(self, pairs):
+        """
+        Index what reached the primary destination, then mirror it to every other destination
+        with one server-side bulk copy from the primary - the file is only ever uploaded once
+        """
+        pairs = [(source, sent) for source, sent in pairs if sent]
+        self.index_sent(pairs)
+        if not pairs:
+            return
+
+        source_by_sent_id = {sent.id: source for source, sent in pairs}
+        sent_messages = [sent for _, sent in pairs]
+        for dest in self.dest_channels[1:]:
+            failed, mirrored = await self.bulk_copy(sent_messages, self.dest_channel, dest)
+            self.index_sent([(source_by_sent_id[sent.id], copy) for sent, copy in mirrored], dest)
+
+            for sent in failed:
+                try:
+                    copy = await self.tg('send', dest, sent.copy, dest)
+                    self.index_sent([(source_by_sent_id[sent.id], copy)], dest)
+                except Exception as e:
+                    logger.error(f"❌ Could not mirror message {sent.id} to {dest}: {e}")
+
+    def index_sent(self, pairs, dest=None):
+        """Remember (source message, sent message) pairs in the dedup index and the file_id cache"""
+        dest = dest or self.dest_channel
+        for source, sent in pairs:
+            source_media = self.media_of(source)
+            sent_media = self.media_of(sent)
+            if not getattr(source_media, 'file_unique_id', None) or not getattr(sent_media, 'file_id', None):
+                continue
+            try:
+                self.media_index.record(source_media.file_unique_id, dest, sent.id, sent_media.file_id)
+                self.file_id_cache.put(source_media.file_unique_id, sent_media.file_id)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not index media of message {source.id}: {e}")
+
+    def cached_file_id(self, message):
+        """Destination file_id of a previous upload of this message's media, if still cached"""
+        file_unique_id = getattr(self.media_of(message), 'file_unique_id', None)
+        return self.file_id_cache.get(file_unique_id) if file_unique_id else None
+
+    async def is_protected_chat(self, chat_id):
+        """Check (once per chat) whether the source forbids copying its content"""
+        if chat_id not in self.protected_chats:
+            try:
+                chat = await self.tg('read', chat_id, self.app.get_chat, chat_id)
+                self.protected_chats[chat_id] = bool(getattr(chat, 'has_protected_content', False))
+            except Exception as e:
+                logger.warning(f"⚠️ Could not check content protection of {chat_id}, assuming protected: {e}")
+                return True
+        return self.protected_chats[chat_id]
+
+    async def bulk_copy(self, messages, from_chat_id, dest=None):
+        """
+        Copy up to 100 messages with one raw ForwardMessages call using drop_author,
+        so the result is an exact copy without forward header. Returns the messages
+        that did not arrive, for the caller to retry one by one, and the
+        (source message, sent message) pairs that did.
+        """
+        dest = dest or self.dest_channel
+        random_ids = {self.app.rnd_id(): message for message in messages}
+        try:
+            updates = await self.tg(
+                'send',
+                dest,
+                self.app.invoke,
+                raw.functions.messages.ForwardMessages(
+                    from_peer=await self.app.resolve_peer(from_chat_id),
+                    to_peer=await self.app.resolve_peer(dest),
+                    id=[message.id for message in messages],
+                    random_id=list(random_ids),
+                    drop_author=True,
+                    drop_media_captions=False
+                )
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Bulk copy of {len(messages)} messages failed, retrying one by one: {e}")
+            return list(messages), []
+
+        # Every forwarded message is reported back with the random_id we gave it
+        delivered = {
+            update.id: random_ids[update.random_id] for update in getattr(updates, 'updates', [])
+            if isinstance(update, raw.types.UpdateMessageID) and update.random_id in random_ids
+        }
+        delivered_ids = {message.id for message in delivered.values()}
+        failed = [message for message in messages if message.id not in delivered_ids]
+
+        sent_pairs = []
+        users = {user.id: user for user in getattr(updates, 'users', [])}
+        chats = {chat.id: chat for chat in getattr(updates, 'chats', [])}
+        for update in getattr(updates, 'updates', []):
+            if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)) and update.message.id in delivered:
+                try:
+                    sent = await types.Message._parse(self.app, update.message, users, chats, replies=0)
+                    sent_pairs.append((delivered[update.message.id], sent))
+                except Exception as e:
+                    logger.warning(f"⚠️ Could not parse copied message {update.message.id}: {e}")
+        return failed, sent_pairs
+
+    async def copy_exact(self, message, chat):
+        """Copy a message server-side (exact caption, no forward header), falling back to download/upload"""
+        try:
+            return await self.tg('send', self.dest_channel, message.copy, self.dest_channel)
+        except Exception as copy_error:
+            logger.warning(f"⚠️ Copy of message {message.id} failed, falling back to download: {copy_error}")
+            return await self.backup_single_message_exact(message, chat)
+
+    def can_relay(self, message):
+        """Only video/audio/document media big enough for SaveBigFilePart can be streamed"""
+        media = message.video or message.audio or message.document
+        return bool(media and (media.file_size or 0) >= BIG_FILE_MIN_SIZE)
+
+    def should_relay(self, message):
+        """Large video/audio/document media (or anything too big for the spool) is streamed instead of downloaded to disk"""
+        if not self.can_relay(message):
+            return False
+        media = message.video or message.audio or message.document
+        if not self.spool.fits_quota(media.file_size):
+            return True
+        return bool(self.relay_min_size and media.file_size >= self.relay_min_size)
+
+    async def relay_exact(self, message, chat):
+        """Relay large media straight from stream_media into a chunked upload, falling back to download/upload"""
+        try:
+            return await self.relay_media(message)
+        except Exception as relay_error:
+            logger.warning(f"⚠️ Streaming relay of message {message.id} failed, falling back to download: {relay_error}")
+            return await self.backup_single_message_exact(message, chat)
+
+    async def relay_media(self, message):
+        """
+        Stream the source file chunk by chunk through a small bounded buffer of upload
+        parts into SaveBigFilePart calls, then send the uploaded file with the original
+        caption and attributes. Disk use stays at zero however big the file is.
+        """
+        media = message.video or message.audio or message.document
+        file_size = media.file_size
+        file_total_parts = math.ceil(file_size / UPLOAD_PART_SIZE)
+        file_id = self.app.rnd_id()
+        parts = asyncio.Queue(maxsize=self.relay_buffer_parts)
+        uploaded = []
+        errors = []
+
+        async def upload_parts():
+            while True:
+                part = await parts.get()
+                if part is None:
+                    return
+                if errors:
+                    # Keep draining so the stream never blocks on a full buffer
+                    continue
+                file_part, data = part
+                try:
+                    await self.app.invoke(raw.functions.upload.SaveBigFilePart(
+                        file_id=file_id,
+                        file_part=file_part,
+                        file_total_parts=file_total_parts,
+                        bytes=data
+                    ))
+                    uploaded.append(file_part)
+                except Exception as e:
+                    errors.append(e)
+
+        uploaders = [asyncio.create_task(upload_parts()) for _ in range(self.relay_upload_workers)]
+        try:
+            await self.rate_limiter.acquire('read', message.chat.id)
+
+            buffer = bytearray()
+            file_part = 0
+            async for chunk in self.app.stream_media(message):
+                buffer.extend(chunk)
+                while len(buffer) >= UPLOAD_PART_SIZE:
+                    await parts.put((file_part, bytes(buffer[:UPLOAD_PART_SIZE])))
+                    del buffer[:UPLOAD_PART_SIZE]
+                    file_part += 1
+                if errors:
+                    raise errors[0]
+            if buffer:
+                await parts.put((file_part, bytes(buffer)))
+                file_part += 1
+
+            for _ in uploaders:
+                await parts.put(None)
+            await asyncio.gather(*uploaders)
+        finally:
+            for uploader in uploaders:
+                uploader.cancel()
+
+        if errors:
+            raise errors[0]
+        if file_part != file_total_parts or len(uploaded) != file_total_parts:
+            raise ValueError(f"streamed {file_part} parts, uploaded {len(uploaded)}, expected {file_total_parts}")
+
+        safe_filename = self.sanitize_filename(getattr(media, 'file_name', None))
+        attributes = [raw.types.DocumentAttributeFilename(file_name=safe_filename)]
+        if message.video:
+            attributes.insert(0, raw.types.DocumentAttributeVideo(
+                supports_streaming=True,
+                duration=media.duration or 0,
+                w=media.width or 0,
+                h=media.height or 0
+            ))
+        elif message.audio:
+            attributes.insert(0, raw.types.DocumentAttributeAudio(
+                duration=media.duration or 0,
+                title=media.title,
+                performer=media.performer
+            ))
+
+        updates = await self.tg(
+            'send',
+            self.dest_channel,
+            self.app.invoke,
+            raw.functions.messages.SendMedia(
+                peer=await self.app.resolve_peer(self.dest_channel),
+                media=raw.types.InputMediaUploadedDocument(
+                    mime_type=media.mime_type or "application/octet-stream",
+                    file=raw.types.InputFileBig(id=file_id, parts=file_total_parts, name=safe_filename),
+                    attributes=attributes
+                ),
+                random_id=self.app.rnd_id(),
+                **await utils.parse_text_entities(self.app, self.get_original_caption(message), None, None)
+            )
+        )
+        logger.info(f"✅ Relayed message {message.id} ({file_size} bytes) without a local copy")
+
+        for update in updates.updates:
+            if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)):
+                return await types.Message._parse(
+                    self.app, update.message,
+                    {user.id: user for user in updates.users},
+                    {chat.id: chat for chat in updates.chats},
+                    replies=0
+                )
+
+    def get_original_caption(self, message):
+        """PRESERVE ORIGINAL CAPTION EXACTLY - NO ADDED METADATA"""
+        original_caption = message.caption or ""
+
+        # For text messages without media, use the text as caption
+        if not message.media and message.text:
+            original_caption = message.text
+
+        return original_caption
+
+    async def download_media(self, message, reserved=None):
+        """
+        Download message media under a sanitized file name, returns the local path.
+        `reserved` is spool space the pipeline already reserved for it in order; without it
+        the download only goes ahead if the spool has room right now
+        """
+        # Get the original file name if available
+        original_filename = None
+        if hasattr(message, 'video') and message.video:
+            original_filename = message.video.file_name
+        elif hasattr(message, 'document') and message.document:
+            original_filename = message.document.file_name
+        elif hasattr(message, 'audio') and message.audio:
+            original_filename = message.audio.file_name
+
+        # Sanitize the filename
+        safe_filename = self.sanitize_filename(original_filename)
+
+        size = self.media_size(message)
+        if reserved is None:
+            await self.spool.reserve(size, wait=False)
+        else:
+            size = reserved
+
+        try:
+            # Download with custom file name to avoid path issues
+            file_path = await self.tg('read', message.chat.id, message.download, file_name=self.spool.path_for(message, safe_filename))
+        except BaseException:
+            await self.spool.release(size)
+            raise
+
+        if file_path:
+            self.spool.track(file_path, size)
+        else:
+            await self.spool.release(size)
+        return file_path
+
+    async def download_album(self, album, reserved=None):
+        """Download every item of an album (into its reserved spool space, if any), returns the paths in album order (None where a download failed)"""
+        file_paths = []
+        for message, size in zip(album, reserved or [None] * len(album)):
+            try:
+                file_paths.append(await self.download_media(message, size))
+            except Exception as download_error:
+                logger.error(f"❌ Download of album item {message.id} failed: {download_error}")
+                file_paths.append(None)
+        return file_paths
+
+    def album_input_media(self, album, files):
+        """Build send_media_group input for an album from local paths or file_ids, keeping original captions"""
+        media = []
+        for message, file in zip(album, files):
+            original_caption = self.get_original_caption(message)
+            if message.video:
+                media.append(InputMediaVideo(file, caption=original_caption, supports_streaming=True))
+            elif message.photo:
+                media.append(InputMediaPhoto(file, caption=original_caption))
+            elif message.audio:
+                media.append(InputMediaAudio(file, caption=original_caption))
+            else:
+                media.append(InputMediaDocument(file, caption=original_caption))
+        return media
+
+    async def send_album_exact(self, album, file_paths):
+        """Send a downloaded album with a single send_media_group, keeping each item's original caption. Returns the sent messages"""
+        file_paths = list(file_paths) + [None] * (len(album) - len(file_paths))
+
+        if all(file_path and os.path.exists(file_path) for file_path in file_paths):
+            try:
+                media = self.album_input_media(album, file_paths)
+                return await self.tg('send', self.dest_channel, self.app.send_media_group, self.dest_channel, media)
+            except Exception as send_error:
+                logger.error(f"❌ Failed to send album {album[0].media_group_id}: {send_error}")
+
+        # Incomplete download or rejected group - fall back to sending item by item
+        return [await self.send_exact(message, file_path) for message, file_path in zip(album, file_paths)]
+
+    async def copy_album(self, album, chat):
+        """Copy an album server-side by its source file_ids in a single send_media_group call"""
+        return await self.send_by_file_ids(album, [self.media_of(message).file_id for message in album], chat)
+
+    async def send_by_file_ids(self, messages, file_ids, chat):
+        """
+        Send a message or an album by file_id (no transfer), keeping original captions.
+        Falls back to download/upload if Telegram rejects the file_ids. Returns the sent messages
+        """
+        try:
+            if messages[0].media_group_id:
+                media = self.album_input_media(messages, file_ids)
+                return await self.tg('send', self.dest_channel, self.app.send_media_group, self.dest_channel, media)
+            return [await self.tg(
+                'send',
+                self.dest_channel,
+                self.app.send_cached_media,
+                self.dest_channel,
+                file_ids[0],
+                caption=self.get_original_caption(messages[0])
+            )]
+        except Exception as send_error:
+            logger.warning(f"⚠️ Sending message {messages[0].id} by file_id failed, falling back to download: {send_error}")
+            for message in messages:
+                file_unique_id = getattr(self.media_of(message), 'file_unique_id', None)
+                if file_unique_id and self.file_id_cache.get(file_unique_id) in file_ids:
+                    self.file_id_cache.discard(file_unique_id)
+
+            if not messages[0].media_group_id:
+                return [await self.backup_single_message_exact(messages[0], chat)]
+
+            file_paths = await self.download_album(messages)
+            try:
+                return await self.send_album_exact(messages, file_paths)
+            finally:
+                for file_path in file_paths:
+                    if file_path:
+                        await self.spool.discard(file_path)
+
+    async def send_exact(self, message, file_path=None):
+        """Send a message to the destination with EXACT original caption, from an already downloaded file. Returns the sent message"""
+        try:
+            original_caption = self.get_original_caption(message)
 
             if message.media:
-                # Get the original file name if available
-                original_filename = None
-                if hasattr(message, 'video') and message.video:
-                    original_filename = message.video.file_name
-                elif hasattr(message, 'document') and message.document:
-                    original_filename = message.document.file_name
-                elif hasattr(message, 'audio') and message.audio:
-                    original_filename = message.audio.file_name
-                
-                # Sanitize the filename
-                safe_filename = self.sanitize_filename(original_filename)
-                
-                # Download with custom file name to avoid path issues
-                file_path = await message.download(file_name=os.path.join(self.downloads_dir, safe_filename))
-                
                 if file_path and os.path.exists(file_path):
                     try:
                         if message.video:
-                            await self.app.send_video(
+                            sent = await self.tg(
+                                'send',
+                                self.dest_channel,
+                                self.app.send_video,
                                 self.dest_channel,
                                 file_path,
                                 caption=original_caption,  # Original caption only
                                 supports_streaming=True
                             )
                         elif message.photo:
-                            await self.app.send_photo(
+                            sent = await self.tg(
+                                'send',
+                                self.dest_channel,
+                                self.app.send_photo,
                                 self.dest_channel,
                                 file_path,
                                 caption=original_caption  # Original caption only
                             )
                         elif message.audio:
-                            await self.app.send_audio(
+                            sent = await self.tg(
+                                'send',
+                                self.dest_channel,
+                                self.app.send_audio,
                                 self.dest_channel,
                                 file_path,
                                 caption=original_caption  # Original caption only
                             )
                         else:
-                            await self.app.send_document(
+                            sent = await self.tg(
+                                'send',
+                                self.dest_channel,
+                                self.app.send_document,
                                 self.dest_channel,
                                 file_path,
                                 caption=original_caption  # Original caption only
                             )
                         
-                        logger.info(f"✅ Backed up message {message.id} with sanitized filename: {safe_filename}")
+                        logger.info(f"✅ Backed up message {message.id} from file: {os.path.basename(file_path)}")
                     except Exception as send_error:
                         logger.error(f"❌ Failed to send message {message.id}: {send_error}")
                         # Try forwarding as fallback
-                        await message.forward(self.dest_channel)
+                        sent = await self.tg('send', self.dest_channel, message.forward, self.dest_channel)
                         logger.info(f"✅ Fallback: Forwarded message {message.id}")
-                    
-                    # Clean up
-                    try:
-                        os.remove(file_path)
-                    except Exception as cleanup_error:
-                        logger.warning(f"⚠️ Could not delete file {file_path}: {cleanup_error}")
                 else:
                     # Forward as fallback if download fails
-                    await message.forward(self.dest_channel)
+                    sent = await self.tg('send', self.dest_channel, message.forward, self.dest_channel)
                     logger.info(f"✅ Fallback: Forwarded message {message.id} (download failed)")
             else:
                 # Text message - send original text only
-                await self.app.send_message(self.dest_channel, original_caption)
+                sent = await self.tg('send', self.dest_channel, self.app.send_message, self.dest_channel, original_caption)
                 logger.info(f"✅ Backed up text message {message.id}")
 
-        except FloodWait as e:
-            logger.warning(f"🚫 Flood wait: {e.value}s")
-            await asyncio.sleep(e.value + 5)
-            await self.backup_single_message_exact(message, chat)
+            return sent
+
         except Exception as e:
             logger.error(f"❌ Failed to backup message {message.id}: {e}")
             # Try forwarding as final fallback
             try:
-                await message.forward(self.dest_channel)
+                sent = await self.tg('send', self.dest_channel, message.forward, self.dest_channel)
                 logger.info(f"✅ Final fallback: Forwarded message {message.id}")
+                return sent
             except Exception as forward_error:
                 logger.error(f"❌ Complete failure for message {message.id}: {forward_error}")
                 raise
 
+    async def backup_single_message_exact(self, message, chat):
+        """Backup a single message with EXACT original caption"""
+        file_path = None
+        try:
+            if message.media:
+                try:
+                    file_path = await self.download_media(message)
+                except Exception as download_error:
+                    logger.error(f"❌ Download of message {message.id} failed: {download_error}")
+
+            return await self.send_exact(message, file_path)
+        finally:
+            # Clean up
+            if file_path:
+                await self.spool.discard(file_path)
+
     async def run_telegram_bot(self):
         """Run the Telegram bot part"""
         try:
@@ -561,9 +2613,13 @@ class SmartDiscoverBackupBot:
                 self.owner_id = me.id
                 logger.info(f"👑 Owner ID set to: {self.owner_id}")
             
-            # Preload user chats
-            chats = await self.get_user_chats()
+            # Rescan dialogs once per start - the snapshot may have missed changes while down,
+            # and an in-memory session only learns peer access hashes from this walk
+            chats = await self.get_user_chats(refresh=True)
             logger.info(f"📋 Found {len(chats)} chats in user dialogs")
+
+            # Pick up backups that were interrupted by a restart
+            asyncio.create_task(self.resume_unfinished_jobs())
             
             await asyncio.Future()  # Run forever
             
@@ -1,12 +1,19 @@
 import asyncio
+import json
 import logging
 import os
 import random
 import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
 from flask import Flask
-from pyrogram import Client, filters
+from pyrogram import Client, filters, raw, utils
 from pyrogram.types import Message
-from pyrogram.errors import FloodWait
+from pyrogram.errors import (
+    FloodWait, MessageIdInvalid, MessageIdsEmpty, MessageEmpty, MediaEmpty, MediaInvalid, GroupedMediaInvalid,
+    ChatSendMediaForbidden, ChatSendPollForbidden, ChatSendStickersForbidden, ChatSendGifsForbidden, VoiceMessagesForbidden
+)
 
 # Create Flask app for port binding
 app = Flask(__name__)
@@ -26,11 +33,163 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Telegram forwards at most 100 messages per forward_messages call
+FORWARD_BATCH_SIZE = 100
+# ...and returns at most 100 messages per history page
+HISTORY_PAGE_SIZE = 100
+# Errors caused by some messages of a batch rather than by the chats - only these are worth splitting the batch for
+PER_MESSAGE_ERRORS = (
+    MessageIdInvalid, MessageIdsEmpty, MessageEmpty, MediaEmpty, MediaInvalid, GroupedMediaInvalid,
+    ChatSendMediaForbidden, ChatSendPollForbidden, ChatSendStickersForbidden, ChatSendGifsForbidden, VoiceMessagesForbidden
+)
+
+class HistoryPager:
+    """
+    Pages a chat's history oldest-first, fetching up to `lookahead` pages ahead while the
+    current page is being forwarded. Every page is one raw GetHistory request starting right
+    after the last message ID of the previous one (offset_id=last+1 with a negative offset,
+    min_id=last), so pages never overlap or skip
+    """
+    def __init__(self, app, entity, page_size=HISTORY_PAGE_SIZE, last_message_id=0, lookahead=2, max_message_id=0):
+        self.app = app
+        self.entity = entity
+        self.page_size = min(page_size, HISTORY_PAGE_SIZE)
+        self.last_message_id = last_message_id
+        self.max_message_id = max_message_id  # Exclusive upper bound, 0 = up to the newest message
+        self.pages = asyncio.Queue(maxsize=max(1, lookahead))
+        self.task = None
+
+    async def _fetch_page(self):
+        """The next page_size messages after last_message_id, oldest first"""
+        while True:
+            # get_chat_history would keep requesting with the same negative offset and
+            # repeat messages on short pages, so each page is exactly one raw request
+            result = None
+            while result is None:
+                try:
+                    result = await self.app.invoke(raw.functions.messages.GetHistory(
+                        peer=await self.app.resolve_peer(self.entity),
+                        offset_id=self.last_message_id + 1,
+                        offset_date=0,
+                        add_offset=-self.page_size,
+                        limit=self.page_size,
+                        max_id=self.max_message_id,
+                        min_id=self.last_message_id,
+                        hash=0
+                    ))
+                except FloodWait as e:
+                    logger.warning(f"🚫 Flood wait: {e.value}s")
+                    await asyncio.sleep(e.value)
+
+            top = max((message.id for message in result.messages), default=0)
+            if top <= self.last_message_id:
+                return []
+
+            messages = await utils.parse_messages(self.app, result, replies=0)
+            unique = {message.id: message for message in messages if message.id > self.last_message_id and not message.empty}
+            self.last_message_id = max(self.last_message_id, top)
+            if unique:
+                return [unique[message_id] for message_id in sorted(unique)]
+
+    async def _prefetch(self):
+        try:
+            while True:
+                page = await self._fetch_page()
+                await self.pages.put(page)
+                if not page:
+                    return
+        except Exception as e:
+            await self.pages.put(e)
+
+    def close(self):
+        if self.task:
+            self.task.cancel()
+
+    async def __aiter__(self):
+        self.task = asyncio.create_task(self._prefetch())
+        try:
+            while True:
+                page = await self.pages.get()
+                if isinstance(page, Exception):
+                    raise page
+                if not page:
+                    return
+                yield page
+        finally:
+            self.close()
+
+class FairScheduler:
+    """
+    Shares `slots` concurrent forward calls between all running jobs in strict turn
+    order - a job gets one batch per turn and then queues behind every other waiting
+    job, so one long mirror never starves the rest
+    """
+    def __init__(self, slots=1):
+        self.slots = slots
+        self.waiters = deque()
+
+    async def acquire(self):
+        if self.slots > 0 and not self.waiters:
+            self.slots -= 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The turn was handed over just before the cancel - pass it on
+                self.release()
+            elif waiter in self.waiters:
+                self.waiters.remove(waiter)
+            raise
+
+    def release(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.slots += 1
+
+    @asynccontextmanager
+    async def turn(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
 class AutoForwarder:
-    def __init__(self, app):
+    def __init__(self, app, lookahead=2, concurrency=1):
         self.app = app
-        self.is_forwarding = False
+        self.lookahead = lookahead
+        self.scheduler = FairScheduler(concurrency)
         self.active_jobs = {}
+        self.finished_jobs = deque(maxlen=10)
+        self.next_job_id = 1
+
+    @property
+    def is_forwarding(self):
+        return bool(self.active_jobs)
+
+    def create_job(self, source_entity, dest_entity) -> dict:
+        """Register a new job with its own ID, state, cancel token and counters"""
+        job = {
+            "id": self.next_job_id,
+            "source": source_entity,
+            "dest": dest_entity,
+            "state": "queued",
+            "cancel": asyncio.Event(),
+            "forwarded": 0,
+            "failed": 0,
+            "last_message_id": 0,
+            "error": None,
+            "started_at": time.time()
+        }
+        self.next_job_id += 1
+        self.active_jobs[job["id"]] = job
+        return job
         
     async def start_auto_forward(
         self,
@@ -38,128 +197,370 @@ class AutoForwarder:
         dest_entity,
         batch_size: int = 100,
         limit: int = None,
-        offset_id: int = 0
+        offset_id: int = 0,
+        job: dict = None
     ) -> dict:
         """
         Start automated forwarding from source to destination
         """
+        job = job or self.create_job(source_entity, dest_entity)
+        pager = None
         try:
-            self.is_forwarding = True
-            forwarded_count = 0
-            failed_count = 0
-            last_message_id = offset_id
+            job["state"] = "running"
+            job["last_message_id"] = offset_id
             
-            logger.info(f"Starting auto-forward from {source_entity} to {dest_entity}")
+            logger.info(f"Starting auto-forward job #{job['id']} from {source_entity} to {dest_entity}")
+
+            # The next pages are fetched while the current one is forwarded
+            pager = HistoryPager(
+                self.app,
+                source_entity,
+                page_size=batch_size,
+                last_message_id=offset_id,
+                lookahead=self.lookahead
+            )
             
-            while self.is_forwarding:
-                # Fetch messages in batches
-                messages = await self._fetch_messages_batch(
-                    source_entity, 
-                    batch_size, 
-                    last_message_id
-                )
-                
-                if not messages:
-                    logger.info("No more messages to forward")
+            async for messages in pager:
+                if job["cancel"].is_set():
                     break
+
+                if limit:
+                    messages = messages[:limit - job["forwarded"]]
                 
-                # Forward the batch
-                success, failed, last_id = await self._forward_batch(
-                    messages, dest_entity
-                )
+                # Forward the batch once it is this job's turn
+                async with self.scheduler.turn():
+                    success, failed, last_id = await self._forward_batch(
+                        messages, dest_entity, job
+                    )
                 
-                forwarded_count += success
-                failed_count += failed
-                last_message_id = last_id
+                job["forwarded"] += success
+                job["failed"] += failed
+                job["last_message_id"] = last_id or job["last_message_id"]
                 
-                logger.info(f"Batch completed: {success} forwarded, {failed} failed")
+                logger.info(f"Job #{job['id']} batch completed: {success} forwarded, {failed} failed")
                 
                 # Check if we've reached the limit
-                if limit and forwarded_count >= limit:
-                    logger.info(f"Reached limit of {limit} messages")
+                if limit and job["forwarded"] >= limit:
+                    logger.info(f"Job #{job['id']} reached limit of {limit} messages")
                     break
                 
                 # Small delay to avoid flooding
                 await asyncio.sleep(1)
+            else:
+                logger.info(f"Job #{job['id']}: no more messages to forward")
             
-            return {
-                "status": "completed",
-                "forwarded": forwarded_count,
-                "failed": failed_count,
-                "last_message_id": last_message_id
-            }
+            job["state"] = "stopped" if job["cancel"].is_set() else "completed"
             
         except Exception as e:
-            logger.error(f"Auto-forward error: {str(e)}")
-            return {
-                "status": "error",
-                "error": str(e),
-                "forwarded": forwarded_count,
-                "failed": failed_count,
-                "last_message_id": last_message_id
-            }
+            logger.error(f"Auto-forward job #{job['id']} error: {str(e)}")
+            job["state"] = "error"
+            job["error"] = str(e)
         finally:
-            self.is_forwarding = False
-    
-    async def _fetch_messages_batch(self, entity, batch_size: int, offset_id: int = 0):
-        """
-        Fetch a batch of messages from the entity
-        """
-        try:
-            messages = []
-            async for message in self.app.get_chat_history(
-                entity,
-                limit=batch_size,
-                offset_id=offset_id
-            ):
-                messages.append(message)
-            
-            return messages
-        except Exception as e:
-            logger.error(f"Error fetching messages: {str(e)}")
-            return []
+            if pager:
+                pager.close()
+            self.active_jobs.pop(job["id"], None)
+            self.finished_jobs.append(job)
+
+        return self.job_summary(job)
     
-    async def _forward_batch(self, messages, dest_entity) -> tuple:
+    async def _forward_batch(self, messages, dest_entity, job) -> tuple:
         """
-        Forward a batch of messages
+        Forward a batch of messages, up to 100 per forward_messages call
         Returns: (success_count, failed_count, last_message_id)
         """
         success_count = 0
         failed_count = 0
         last_message_id = 0
         
-        for message in messages:
-            if not self.is_forwarding:
+        for start in range(0, len(messages), FORWARD_BATCH_SIZE):
+            if job["cancel"].is_set():
                 break
-                
-            try:
-                # Use Pyrogram's forward method (no download/upload)
-                await message.forward(dest_entity)
-                success_count += 1
-                last_message_id = message.id
-                
-                # Small delay between messages
-                await asyncio.sleep(0.5)
-                
-            except Exception as e:
-                logger.error(f"Failed to forward message {message.id}: {str(e)}")
-                failed_count += 1
-                # Continue with next message even if one fails
+
+            chunk = messages[start:start + FORWARD_BATCH_SIZE]
+            success, failed = await self._forward_ids(
+                chunk[0].chat.id,
+                dest_entity,
+                [message.id for message in chunk]
+            )
+            success_count += success
+            failed_count += failed
+            last_message_id = chunk[-1].id
         
         return success_count, failed_count, last_message_id
+
+    async def _forward_ids(self, source_entity, dest_entity, message_ids) -> tuple:
+        """
+        Forward message IDs with one call (no download/upload). A batch rejected because of
+        some of its messages is split in half and retried, so failing IDs are found in a
+        logarithmic number of calls. Errors that hit the whole batch (restricted or private
+        source, no write access to the destination, ...) are raised to the caller
+        Returns: (success_count, failed_count)
+        """
+        while True:
+            try:
+                forwarded = await self.app.forward_messages(dest_entity, source_entity, message_ids)
+                break
+            except FloodWait as e:
+                logger.warning(f"🚫 Flood wait: {e.value}s")
+                await asyncio.sleep(e.value)
+            except PER_MESSAGE_ERRORS as e:
+                if len(message_ids) == 1:
+                    logger.error(f"Failed to forward message {message_ids[0]}: {str(e)}")
+                    return 0, 1
+
+                middle = len(message_ids) // 2
+                left_success, left_failed = await self._forward_ids(source_entity, dest_entity, message_ids[:middle])
+                right_success, right_failed = await self._forward_ids(source_entity, dest_entity, message_ids[middle:])
+                return left_success + right_success, left_failed + right_failed
+
+        # Deleted or unforwardable messages are silently left out of the result
+        forwarded = forwarded if isinstance(forwarded, list) else [forwarded]
+        return len(forwarded), len(message_ids) - len(forwarded)
     
-    def stop_forwarding(self):
-        """Stop any active forwarding process"""
-        self.is_forwarding = False
-        logger.info("Forwarding stopped by user")
+    def stop_forwarding(self, job_id=None) -> list:
+        """Stop one forwarding job, or all of them; returns the IDs that were signalled"""
+        jobs = [self.active_jobs[job_id]] if job_id in self.active_jobs else [] if job_id else list(self.active_jobs.values())
+        for job in jobs:
+            job["cancel"].set()
+            logger.info(f"Forwarding job #{job['id']} stopped by user")
+        return [job["id"] for job in jobs]
+
+    def job_summary(self, job) -> dict:
+        """A job's state and counters, without the cancel token"""
+        return {
+            "id": job["id"],
+            "status": job["state"],
+            "source": job["source"],
+            "dest": job["dest"],
+            "forwarded": job["forwarded"],
+            "failed": job["failed"],
+            "last_message_id": job["last_message_id"],
+            "error": job["error"],
+            "elapsed": int(time.time() - job["started_at"])
+        }
     
-    async def get_forwarding_status(self) -> dict:
-        """Get current forwarding status"""
+    async def get_forwarding_status(self, job_id=None) -> dict:
+        """Get current forwarding status, for every job or a single one"""
+        jobs = list(self.active_jobs.values()) + [job for job in self.finished_jobs if job["id"] not in self.active_jobs]
+        if job_id:
+            jobs = [job for job in jobs if job["id"] == job_id]
         return {
             "is_forwarding": self.is_forwarding,
-            "active_jobs": len(self.active_jobs)
+            "active_jobs": len(self.active_jobs),
+            "jobs": [self.job_summary(job) for job in jobs]
         }
 
+class LiveMirror:
+    """
+    Live tail of source chats - new posts are forwarded as they arrive through the
+    AutoForwarder engine, and albums are collected for a moment and sent as one unit.
+    The last forwarded ID per source is saved, so startup, reconnects and gaps between
+    live posts catch up from there instead of re-scanning history
+    """
+    def __init__(self, forwarder, path, album_delay=1.5):
+        self.forwarder = forwarder
+        self.app = forwarder.app
+        self.path = path
+        self.album_delay = album_delay
+        self.routes = {}  # source chat ID -> destination chat ID
+        self.last_seen = {}  # source chat ID -> last forwarded message ID
+        self.sources = filters.chat()  # The live handler's filter, edited in place
+        self.albums = {}  # source chat ID -> album being collected
+        self.locks = {}
+        self.disconnected = True  # Live posts wait for the startup catch-up
+        self.reconnect_task = None
+        self.load()
+
+    def lock(self, source):
+        return self.locks.setdefault(source, asyncio.Lock())
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+            self.routes = {int(source): int(dest) for source, dest in state.get("routes", {}).items()}
+            self.last_seen = {int(source): int(last) for source, last in state.get("last_seen", {}).items()}
+            self.sources.update(self.routes)
+            logger.info(f"📡 Loaded {len(self.routes)} live mirrors")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load live mirrors from {self.path}: {e}")
+
+    def save(self):
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({"routes": self.routes, "last_seen": self.last_seen}, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save live mirrors to {self.path}: {e}")
+
+    async def add(self, source, dest):
+        """Mirror new posts of source from now on"""
+        newest = [message async for message in self.app.get_chat_history(source, limit=1)]
+        async with self.lock(source):
+            self.routes[source] = dest
+            self.last_seen[source] = newest[0].id if newest else 0
+            self.sources.add(source)
+            self.save()
+        return self.last_seen[source]
+
+    def remove(self, source):
+        if source not in self.routes:
+            return False
+        self.routes.pop(source)
+        self.last_seen.pop(source, None)
+        self.sources.discard(source)
+        album = self.albums.pop(source, None)
+        if album and album["timer"]:
+            album["timer"].cancel()
+        self.save()
+        return True
+
+    async def start(self):
+        """Catch every source up from its last seen ID - the only history read a mirror ever does"""
+        self.disconnected = False
+        for source in list(self.routes):
+            try:
+                await self.catch_up(source)
+            except Exception as e:
+                logger.error(f"Live mirror catch-up of {source} failed: {str(e)}")
+
+    def on_disconnect(self):
+        """Catch up once the connection is back - posts missed meanwhile are never replayed as updates"""
+        self.disconnected = True
+        if not self.reconnect_task or self.reconnect_task.done():
+            self.reconnect_task = asyncio.create_task(self._catch_up_on_reconnect())
+
+    async def _catch_up_on_reconnect(self, poll_interval=1):
+        # A session restart keeps is_connected set, only the session's is_started tells it is back
+        while not (self.app.is_connected and self.app.session and self.app.session.is_started.is_set()):
+            await asyncio.sleep(poll_interval)
+        if self.disconnected:
+            logger.info("📡 Reconnected, catching up live mirrors")
+            await self.start()
+
+    async def catch_up(self, source):
+        """Forward whatever source posted after its last seen ID, albums kept whole"""
+        async with self.lock(source):
+            await self._catch_up(source)
+
+    async def _catch_up(self, source, before=None):
+        """
+        Catch up with the source's lock held. With `before`, only messages older than that ID
+        are forwarded and an album at the very end is returned unsent, so the live post can
+        still join it
+        """
+        dest = self.routes.get(source)
+        if dest is None:
+            return []
+
+        pager = HistoryPager(
+            self.app,
+            source,
+            last_message_id=self.last_seen.get(source, 0),
+            lookahead=self.forwarder.lookahead,
+            max_message_id=before or 0
+        )
+        carry = []
+        caught = 0
+        try:
+            async for page in pager:
+                page = carry + page
+                # An album cut off at the end of a page waits for the rest of it
+                cut = len(page)
+                while cut > 0 and page[-1].media_group_id and page[cut - 1].media_group_id == page[-1].media_group_id:
+                    cut -= 1
+                page, carry = page[:cut], page[cut:]
+                if page:
+                    await self._send(source, dest, page)
+                    caught += len(page)
+            if carry and before is None:
+                await self._send(source, dest, carry)
+                caught += len(carry)
+                carry = []
+        finally:
+            pager.close()
+
+        if caught:
+            logger.info(f"📡 Live mirror {source} caught up on {caught} messages")
+        return carry
+
+    async def on_message(self, message):
+        """Live handler - forward a new post, or collect it into its album"""
+        source = message.chat.id
+        try:
+            if self.disconnected:
+                # Posts missed before startup or while offline go out before the new one
+                await self.start()
+
+            async with self.lock(source):
+                dest = self.routes.get(source)
+                last_seen = self.last_seen.get(source, 0)
+                if dest is None or message.id <= last_seen:
+                    return
+
+                # Handlers run concurrently, so posts can get here out of order - rather than
+                # trusting arrival order, fill any gap below this post from history first
+                album = self.albums.get(source)
+                newest = max(last_seen, *(part.id for part in album["messages"])) if album else last_seen
+                if message.id > newest + 1:
+                    if album:
+                        # Its parts are all older than this post and get fetched again
+                        self.albums.pop(source)
+                        if album["timer"]:
+                            album["timer"].cancel()
+                    carry = await self._catch_up(source, before=message.id)
+                    if carry:
+                        self.albums[source] = {"group": carry[0].media_group_id, "messages": carry, "timer": None}
+
+                album = self.albums.get(source)
+                if album and any(part.id == message.id for part in album["messages"]):
+                    # Already collected by a catch-up
+                    return
+                if album and album["group"] != message.media_group_id:
+                    await self._flush_album(source)
+
+                if message.media_group_id:
+                    album = self.albums.setdefault(source, {"group": message.media_group_id, "messages": [], "timer": None})
+                    album["messages"].append(message)
+                    if album["timer"]:
+                        album["timer"].cancel()
+                    album["timer"] = asyncio.create_task(self._album_timer(source))
+                    return
+
+                await self._send(source, dest, [message])
+        except Exception as e:
+            logger.error(f"Live mirror of message {message.id} from {source} failed: {str(e)}")
+
+    async def _album_timer(self, source):
+        """Send an album once no new part has arrived for album_delay seconds"""
+        await asyncio.sleep(self.album_delay)
+        async with self.lock(source):
+            await self._flush_album(source)
+
+    async def _flush_album(self, source):
+        album = self.albums.pop(source, None)
+        if not album:
+            return
+        if album["timer"] and album["timer"] is not asyncio.current_task():
+            album["timer"].cancel()
+
+        last_seen = self.last_seen.get(source, 0)
+        messages = sorted((message for message in album["messages"] if message.id > last_seen), key=lambda message: message.id)
+        if messages and source in self.routes:
+            await self._send(source, self.routes[source], messages)
+
+    async def _send(self, source, dest, messages):
+        """Forward through the shared engine (taking a fair turn with bulk jobs) and remember the last ID"""
+        async with self.forwarder.scheduler.turn():
+            success, failed = await self.forwarder._forward_ids(source, dest, [message.id for message in messages])
+        if failed:
+            logger.warning(f"📡 Live mirror {source}: {failed} of {len(messages)} messages could not be forwarded")
+        self.last_seen[source] = max(self.last_seen.get(source, 0), messages[-1].id)
+        self.save()
+
 class SmartDiscoverBackupBot:
     def __init__(self):
         # Get environment variables
@@ -178,8 +579,22 @@ class SmartDiscoverBackupBot:
             session_string=self.session_string
         )
         
-        # Initialize auto forwarder
-        self.auto_forwarder = AutoForwarder(self.app)
+        # Initialize auto forwarder (history pages fetched ahead of the forwarding,
+        # forward calls shared fairly between all running jobs)
+        self.auto_forwarder = AutoForwarder(
+            self.app,
+            lookahead=int(os.getenv('FORWARD_LOOKAHEAD', '2')),
+            concurrency=int(os.getenv('FORWARD_CONCURRENCY', '2'))
+        )
+
+        # Live mirrors of source chats, resumed from their last seen IDs after a restart
+        state_dir = os.getenv('STATE_DIR', 'state')
+        os.makedirs(state_dir, exist_ok=True)
+        self.live_mirror = LiveMirror(
+            self.auto_forwarder,
+            os.path.join(state_dir, 'mirrors.json'),
+            album_delay=float(os.getenv('MIRROR_ALBUM_DELAY', '1.5'))
+        )
         
         self.setup_handlers()
         self.chat_cache = {}  # Cache for chat IDs
@@ -211,6 +626,29 @@ class SmartDiscoverBackupBot:
         async def stop_forward_handler(client, message):
             await self.handle_stop_forward(message)
 
+        # Live mirror handlers
+        @self.app.on_message(filters.command("mirror"))
+        async def mirror_handler(client, message):
+            await self.handle_mirror(message)
+
+        @self.app.on_message(filters.command("unmirror"))
+        async def unmirror_handler(client, message):
+            await self.handle_unmirror(message)
+
+        @self.app.on_message(filters.command("mirrors"))
+        async def mirrors_handler(client, message):
+            await self.handle_mirrors(message)
+
+        # New posts in mirrored chats - the filter follows /mirror and /unmirror
+        @self.app.on_message(self.live_mirror.sources, group=1)
+        async def live_mirror_handler(client, message):
+            await self.live_mirror.on_message(message)
+
+        @self.app.on_disconnect()
+        async def disconnect_handler(client):
+            # Missed posts are read from history, not trusted to the update stream
+            self.live_mirror.on_disconnect()
+
     async def handle_start(self, message: Message):
         """Handle /start command"""
         help_text = """
@@ -224,14 +662,21 @@ class SmartDiscoverBackupBot:
 
 ✅ **Auto-Forward Features:**
 • `/autoforward source_channel dest_channel` - Bulk forward
-• `/forward_status` - Check status  
-• `/stop_forward` - Stop forwarding
+• Several jobs can run at once, each with its own job ID
+• `/forward_status [job id]` - Check status  
+• `/stop_forward <job id|all>` - Stop forwarding
+
+✅ **Live Mirror Features:**
+• `/mirror source_channel dest_channel` - Forward new posts as they arrive
+• `/unmirror source_channel` - Stop mirroring
+• `/mirrors` - List live mirrors
 
 **Commands:**
 `/backup [link]` - Backup specific messages
 `/autoforward` - Bulk forward entire channels
 `/chats` - List your available groups
 `/forward_status` - Check forwarding status
+`/stop_forward <job id|all>` - Stop a forwarding job
     """
         await message.reply(help_text)
 
@@ -315,11 +760,6 @@ class SmartDiscoverBackupBot:
             limit = int(message.command[3]) if len(message.command) > 3 else None
             batch_size = int(message.command[4]) if len(message.command) > 4 else 100
             
-            # Check if forwarding is already active
-            if self.auto_forwarder.is_forwarding:
-                await message.reply("❌ Another forwarding job is already running. Use `/stop_forward` to stop it first.")
-                return
-            
             await message.reply("🔄 Starting auto-forward...")
             
             # Resolve source and destination entities
@@ -330,9 +770,10 @@ class SmartDiscoverBackupBot:
                 await message.reply(f"❌ Error resolving channels: {str(e)}")
                 return
             
-            # Start forwarding in background
+            # Start forwarding in background - other jobs keep running alongside
+            job = self.auto_forwarder.create_job(source_entity.id, dest_entity.id)
             asyncio.create_task(
-                self.run_auto_forward(message, source_entity, dest_entity, limit, batch_size)
+                self.run_auto_forward(message, source_entity, dest_entity, limit, batch_size, job)
             )
             
         except Exception as e:
@@ -349,17 +790,18 @@ class SmartDiscoverBackupBot:
         except Exception as e:
             raise Exception(f"Could not resolve {entity_input}: {str(e)}")
 
-    async def run_auto_forward(self, message, source_entity, dest_entity, limit, batch_size):
+    async def run_auto_forward(self, message, source_entity, dest_entity, limit, batch_size, job):
         """Run auto-forwarding and send progress updates"""
         try:
             # Send initial status
             status_msg = await message.reply(
-                f"🚀 **Auto-Forward Started**\n"
+                f"🚀 **Auto-Forward Job #{job['id']} Started**\n"
                 f"**From:** {source_entity.title if hasattr(source_entity, 'title') else 'Unknown'}\n"
                 f"**To:** {dest_entity.title if hasattr(dest_entity, 'title') else 'Unknown'}\n"
                 f"**Batch Size:** {batch_size}\n"
                 f"**Limit:** {limit or 'No limit'}\n"
-                f"**Status:** Processing..."
+                f"**Status:** Processing...\n"
+                f"Use `/stop_forward {job['id']}` to stop it."
             )
             
             # Start forwarding
@@ -367,20 +809,21 @@ class SmartDiscoverBackupBot:
                 source_entity=source_entity.id,
                 dest_entity=dest_entity.id,
                 batch_size=batch_size,
-                limit=limit
+                limit=limit,
+                job=job
             )
             
             # Send completion message
-            if result["status"] == "completed":
+            if result["status"] in ("completed", "stopped"):
                 await status_msg.edit(
-                    f"✅ **Auto-Forward Completed**\n"
+                    f"{'✅' if result['status'] == 'completed' else '🛑'} **Auto-Forward Job #{job['id']} {result['status'].title()}**\n"
                     f"**Forwarded:** {result['forwarded']} messages\n"
                     f"**Failed:** {result['failed']} messages\n"
                     f"**Last Message ID:** {result.get('last_message_id', 'N/A')}"
                 )
             else:
                 await status_msg.edit(
-                    f"❌ **Auto-Forward Error**\n"
+                    f"❌ **Auto-Forward Job #{job['id']} Error**\n"
                     f"**Error:** {result['error']}\n"
                     f"**Partial Results:** {result['forwarded']} forwarded, {result['failed']} failed"
                 )
@@ -389,17 +832,31 @@ class SmartDiscoverBackupBot:
             await message.reply(f"❌ Auto-forward task error: {str(e)}")
 
     async def handle_forward_status(self, message: Message):
-        """Check current forwarding status"""
+        """Check current forwarding status - /forward_status [job id]"""
         try:
-            status = await self.auto_forwarder.get_forwarding_status()
+            job_id = int(message.command[1]) if len(message.command) > 1 else None
+            status = await self.auto_forwarder.get_forwarding_status(job_id)
+
+            if job_id and not status["jobs"]:
+                await message.reply(f"ℹ️ No forwarding job #{job_id} found.")
+                return
             
             if status["is_forwarding"]:
                 message_text = "🔄 **Auto-Forward Status: RUNNING**\n"
-                message_text += f"Active jobs: {status['active_jobs']}\n"
-                message_text += "Use `/stop_forward` to stop forwarding."
+                message_text += f"Active jobs: {status['active_jobs']}\n\n"
             else:
                 message_text = "✅ **Auto-Forward Status: IDLE**\n"
-                message_text += "No active forwarding jobs."
+                message_text += "No active forwarding jobs.\n\n"
+
+            for job in status["jobs"]:
+                message_text += f"**Job #{job['id']}** - {job['status']}\n"
+                message_text += f"   {job['source']} → {job['dest']}\n"
+                message_text += f"   ✅ {job['forwarded']} forwarded, ❌ {job['failed']} failed, last ID {job['last_message_id']}\n"
+                if job["error"]:
+                    message_text += f"   ⚠️ {job['error']}\n"
+
+            if status["is_forwarding"]:
+                message_text += "\nUse `/stop_forward <job id>` to stop a job."
                 
             await message.reply(message_text)
             
@@ -407,17 +864,83 @@ class SmartDiscoverBackupBot:
             await message.reply(f"❌ Error getting status: {str(e)}")
 
     async def handle_stop_forward(self, message: Message):
-        """Stop active forwarding process"""
+        """Stop active forwarding jobs - /stop_forward <job id|all>"""
         try:
-            if self.auto_forwarder.is_forwarding:
-                self.auto_forwarder.stop_forwarding()
-                await message.reply("🛑 Auto-forwarding stopped.")
-            else:
+            if not self.auto_forwarder.is_forwarding:
                 await message.reply("ℹ️ No active forwarding job to stop.")
+                return
+
+            target = message.command[1].lower() if len(message.command) > 1 else None
+            if target is None and len(self.auto_forwarder.active_jobs) > 1:
+                jobs = ", ".join(f"#{job_id}" for job_id in self.auto_forwarder.active_jobs)
+                await message.reply(f"ℹ️ Several jobs are running ({jobs}). Use `/stop_forward <job id>` or `/stop_forward all`.")
+                return
+
+            stopped = self.auto_forwarder.stop_forwarding(None if target in (None, "all") else int(target))
+            if stopped:
+                await message.reply(f"🛑 Stopping auto-forward job(s): {', '.join('#' + str(job_id) for job_id in stopped)}")
+            else:
+                await message.reply(f"ℹ️ No active forwarding job #{target}.")
                 
         except Exception as e:
             await message.reply(f"❌ Error stopping forward: {str(e)}")
 
+    async def handle_mirror(self, message: Message):
+        """Handle /mirror command - start live mirroring of a source chat"""
+        try:
+            if len(message.command) < 3:
+                await message.reply(
+                    "**Usage:** `/mirror source_channel dest_channel`\n\n"
+                    "New posts (albums included) are forwarded as they arrive.\n"
+                    "Use `/autoforward` first to copy the existing history."
+                )
+                return
+
+            try:
+                source_entity = await self.resolve_entity(message.command[1])
+                dest_entity = await self.resolve_entity(message.command[2])
+            except Exception as e:
+                await message.reply(f"❌ Error resolving channels: {str(e)}")
+                return
+
+            last_seen = await self.live_mirror.add(source_entity.id, dest_entity.id)
+            await message.reply(
+                f"📡 **Live Mirror Started**\n"
+                f"**From:** {getattr(source_entity, 'title', None) or source_entity.id}\n"
+                f"**To:** {getattr(dest_entity, 'title', None) or dest_entity.id}\n"
+                f"Posts after message {last_seen} will be forwarded."
+            )
+
+        except Exception as e:
+            await message.reply(f"❌ Error: {str(e)}")
+
+    async def handle_unmirror(self, message: Message):
+        """Handle /unmirror command"""
+        try:
+            if len(message.command) < 2:
+                await message.reply("**Usage:** `/unmirror source_channel`")
+                return
+
+            source_entity = await self.resolve_entity(message.command[1])
+            if self.live_mirror.remove(source_entity.id):
+                await message.reply("🛑 Live mirror stopped.")
+            else:
+                await message.reply("ℹ️ That chat is not being mirrored.")
+
+        except Exception as e:
+            await message.reply(f"❌ Error: {str(e)}")
+
+    async def handle_mirrors(self, message: Message):
+        """List live mirrors"""
+        if not self.live_mirror.routes:
+            await message.reply("ℹ️ No live mirrors. Use `/mirror source_channel dest_channel` to add one.")
+            return
+
+        response = "📡 **Live Mirrors:**\n\n"
+        for source, dest in self.live_mirror.routes.items():
+            response += f"`{source}` → `{dest}` (last message {self.live_mirror.last_seen.get(source, 0)})\n"
+        await message.reply(response)
+
     def extract_message_ids_all_formats(self, link):
         """
         Extract message IDs from ALL formats including ranges:
@@ -673,6 +1196,9 @@ class SmartDiscoverBackupBot:
             # Preload user chats
             chats = await self.get_user_chats()
             logger.info(f"📋 Found {len(chats)} chats in user dialogs")
+
+            # Forward what the live mirrors missed while the bot was down
+            asyncio.create_task(self.live_mirror.start())
             
             await asyncio.Future()  # Run forever
             